@@ -20,6 +20,33 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = env.str('SECRET_KEY')
 TELEGRAM_BOT_TOKEN=env.str('TELEGRAM_BOT_TOKEN')
 
+# Bot API client (see api.telegram.TelegramClient)
+# Point TELEGRAM_API_URL at `python manage.py fake_telegram_server` to test without the real Bot API
+TELEGRAM_API_URL = env.str('TELEGRAM_API_URL', 'https://api.telegram.org')
+TELEGRAM_CONNECT_TIMEOUT = env.float('TELEGRAM_CONNECT_TIMEOUT', 5)
+TELEGRAM_READ_TIMEOUT = env.float('TELEGRAM_READ_TIMEOUT', 15)
+TELEGRAM_MAX_RETRIES = env.int('TELEGRAM_MAX_RETRIES', 3)
+TELEGRAM_RETRY_BACKOFF = env.float('TELEGRAM_RETRY_BACKOFF', 1)  # seconds, doubled on every retry
+TELEGRAM_POOL_SIZE = env.int('TELEGRAM_POOL_SIZE', 10)
+
+# Outgoing traffic pacing shared by all processes (see api.ratelimit)
+TELEGRAM_RATE_LIMIT = env.bool('TELEGRAM_RATE_LIMIT', True)
+TELEGRAM_GLOBAL_RATE = env.float('TELEGRAM_GLOBAL_RATE', 30)  # messages per second
+TELEGRAM_CHAT_RATE = env.float('TELEGRAM_CHAT_RATE', 1)  # messages per second to a single chat
+
+# Outbox delivery (see `python manage.py send_notifications`)
+NOTIFICATION_MAX_ATTEMPTS = env.int('NOTIFICATION_MAX_ATTEMPTS', 5)
+NOTIFICATION_RETRY_DELAY = env.int('NOTIFICATION_RETRY_DELAY', 30)  # seconds, multiplied by attempt number
+NOTIFICATION_SENDING_TIMEOUT = env.int('NOTIFICATION_SENDING_TIMEOUT', 300)  # seconds before a claimed row is retried
+NOTIFICATION_DEDUP_WINDOW = env.int('NOTIFICATION_DEDUP_WINDOW', 600)  # seconds, 0 disables
+NOTIFICATION_DIGEST_WINDOW = env.int('NOTIFICATION_DIGEST_WINDOW', 0)  # seconds to collect task messages into one, 0 disables
+NOTIFICATION_RETENTION = env.int('NOTIFICATION_RETENTION', 30)  # days, sent rows are deleted after (see `python manage.py purge_notifications`)
+DELIVERY_RETENTION = env.int('DELIVERY_RETENTION', 30)  # days, delivery records are deleted after
+
+# Admin broadcasts (see `python manage.py run_broadcasts`)
+BROADCAST_CONCURRENCY = env.int('BROADCAST_CONCURRENCY', 20)  # messages in flight at once
+BROADCAST_RUNNING_TIMEOUT = env.int('BROADCAST_RUNNING_TIMEOUT', 300)  # seconds without progress before a running broadcast is queued again
+
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = bool(env.int('DEBUG'))
 
@@ -52,6 +79,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -60,6 +88,18 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# JSON responses of at least this many bytes are compressed (see api.middleware), brotli needs the `brotli` package
+COMPRESSION_MIN_SIZE = env.int('COMPRESSION_MIN_SIZE', 1024)
+COMPRESSION_BROTLI_QUALITY = env.int('COMPRESSION_BROTLI_QUALITY', 5)
+
+REST_FRAMEWORK = {
+    # orjson backed, falls back to the stock JSONRenderer without it (see api.renderers)
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
 ROOT_URLCONF = 'PROJECT.urls'
 
 TEMPLATES = [
@@ -91,6 +131,11 @@ if DEBUG:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # Rate limit buckets are updated from several threads at once (see api.ratelimit)
+            'OPTIONS': {
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20,
+            },
         },
         'bot': {
             # Telegram bot DB
@@ -125,6 +170,52 @@ else:
 
 DATABASE_ROUTERS = ['PROJECT.routers.DayRouter']
 
+# Shared between processes, signals in the admin invalidate what the API cached (see api.cache)
+CACHES = {
+    'default': {
+        'BACKEND': env.str('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': env.str('CACHE_LOCATION', str(BASE_DIR / 'cache')),
+        'OPTIONS': {
+            # Two cached task lists per bot user, a third of the entries is culled once it is exceeded
+            'MAX_ENTRIES': env.int('CACHE_MAX_ENTRIES', 5000),
+        },
+    },
+    # Task cache generation and hit counters, a few keys that must never be culled
+    'counters': {
+        'BACKEND': env.str('COUNTERS_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': env.str('COUNTERS_CACHE_LOCATION', str(BASE_DIR / 'cache' / 'counters')),
+    },
+}
+
+TASK_CACHE_TIMEOUT = env.int('TASK_CACHE_TIMEOUT', 60 * 60)  # seconds
+
+# Generated attendance reports of past periods (see api.reports.cached_report)
+REPORT_CACHE_DIR = env.str('REPORT_CACHE_DIR', str(BASE_DIR / 'cache' / 'reports'))
+REPORT_CACHE_MAX_SIZE = env.int('REPORT_CACHE_MAX_SIZE', 200 * 1024 * 1024)  # bytes
+
+# Ranges longer than this many days are generated by the run_report_jobs worker instead of within the request
+REPORT_JOB_MIN_DAYS = env.int('REPORT_JOB_MIN_DAYS', 62)
+REPORT_JOB_RETENTION = env.int('REPORT_JOB_RETENTION', 7)  # days, finished jobs and their files are deleted after
+REPORT_JOB_RUNNING_TIMEOUT = env.int('REPORT_JOB_RUNNING_TIMEOUT', 600)  # seconds without progress before a running job is failed, the form gives up waiting after as long
+
+# Paged task lists (see api.pagination), used once the bot passes cursor, page_size or a filter
+TASK_PAGE_SIZE = env.int('TASK_PAGE_SIZE', 20)
+TASK_MAX_PAGE_SIZE = env.int('TASK_MAX_PAGE_SIZE', 100)
+
+# Serve the bot facing views from api.async_views, only under an ASGI server (PROJECT/asgi.py)
+ASYNC_API_VIEWS = env.bool('ASYNC_API_VIEWS', False)
+
+# Delta sync of task lists (see api.views.get_task_changes)
+TASK_TOMBSTONE_RETENTION = env.int('TASK_TOMBSTONE_RETENTION', 30)  # days, older sync tokens get a full reload
+TASK_SYNC_OVERLAP = env.int('TASK_SYNC_OVERLAP', 5)  # seconds looked back past a sync token or the last streamed event
+
+# Server-Sent Events of task changes (see api.events), seconds unless noted
+TASK_EVENTS_POLL_INTERVAL = env.float('TASK_EVENTS_POLL_INTERVAL', 0.5)
+TASK_EVENTS_HEARTBEAT = env.int('TASK_EVENTS_HEARTBEAT', 15)
+TASK_EVENTS_MAX_DURATION = env.int('TASK_EVENTS_MAX_DURATION', 5 * 60)
+TASK_EVENTS_RETRY = env.int('TASK_EVENTS_RETRY', 3)
+TASK_EVENT_RETENTION = env.int('TASK_EVENT_RETENTION', 24)  # hours
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -274,6 +365,26 @@ UNFOLD = {
                         "icon": "apartment",
                         "link": reverse_lazy("admin:api_object_changelist"),
                     },
+                    {
+                        "title": _("Уведомления"),
+                        "icon": "notifications",
+                        "link": reverse_lazy("admin:api_notification_changelist"),
+                    },
+                    {
+                        "title": _("Рассылки"),
+                        "icon": "campaign",
+                        "link": reverse_lazy("admin:api_broadcast_changelist"),
+                    },
+                    {
+                        "title": _("Отправки"),
+                        "icon": "monitoring",
+                        "link": reverse_lazy("admin:api_delivery_changelist"),
+                    },
+                    {
+                        "title": _("Отчеты"),
+                        "icon": "description",
+                        "link": reverse_lazy("admin:api_reportjob_changelist"),
+                    },
                 ],
             },
         ],
@@ -1,6 +1,9 @@
 from django.contrib import admin
 from django.contrib.auth.models import Group
 from django.db.models import Count
+from django.shortcuts import redirect
+from django.urls import reverse
+from django.utils.html import format_html
 
 from unfold.admin import ModelAdmin, StackedInline
 from unfold.contrib.filters.admin import RangeDateFilter
@@ -8,12 +11,27 @@ from unfold.contrib.filters.admin import RangeDateFilter
 from .models import (
     Specialization, User, Brigade, Foreman, Worker, Day,
     Attendance, BotUser, Task, FinishedWork, FinishedWorkPhoto,
-    ObjectPhoto, Object, Freshman
+    ObjectPhoto, Object, Freshman, Notification, RateLimitBucket, Delivery,
+    Broadcast, ReportJob
 )
 
 admin.site.unregister(Group)
 
 
+def create_broadcast(modeladmin, request, queryset):
+    """
+    Start a broadcast draft addressed to the selected users
+    """
+
+    chat_ids = list(queryset.values_list("telegram_id", flat=True))
+    broadcast = Broadcast.objects.create(text="", chat_ids=chat_ids)
+    modeladmin.message_user(request, f"Черновик рассылки для {len(chat_ids)} получателей создан, введите текст")
+    return redirect(reverse("admin:api_broadcast_change", args=[broadcast.pk]))
+
+
+create_broadcast.short_description = "Создать рассылку для выбранных"
+
+
 class BaseUserAdmin(ModelAdmin):
     list_display = (
         "telegram_id", "first_name", "last_name",
@@ -63,6 +81,7 @@ class BaseUserAdmin(ModelAdmin):
 
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
+    actions = [create_broadcast]
     list_filter_submit = True
     list_filter = [
         ["created", RangeDateFilter],
@@ -166,6 +185,7 @@ class BotUserAdmin(ModelAdmin):
     search_fields = ["first_name", "last_name", "middle_name"]
     list_display = ["first_name", "last_name", "middle_name"]
     list_display_links = ["first_name", "last_name", "middle_name"]
+    actions = [create_broadcast]
 
     def has_add_permission(self, request):
         return False  # disable create
@@ -270,3 +290,151 @@ class FreshmanAdmin(ModelAdmin):
         ["created", RangeDateFilter],
         ["updated", RangeDateFilter],
     ]
+
+
+@admin.register(Notification)
+class NotificationAdmin(ModelAdmin):
+    list_display = ["pk", "chat_id", "task", "status", "attempts", "created", "sent_at"]
+    list_display_links = ["pk", "chat_id"]
+    search_fields = ["chat_id", "task__name"]
+    search_help_text = "Telegram ID или название задачи"
+
+    list_filter_submit = True
+    list_filter = [
+        ["created", RangeDateFilter],
+        ["sent_at", RangeDateFilter],
+        "status",
+    ]
+
+    def pk(self, obj):
+        return f"#{obj.pk}"
+
+    pk.short_description = "ID"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(RateLimitBucket)
+class RateLimitBucketAdmin(ModelAdmin):
+    list_display = ["key", "available_tokens", "rate", "capacity"]
+    search_fields = ["key"]
+    search_help_text = "Ключ лимита, например global или chat:<Telegram ID>"
+
+    def available_tokens(self, obj):
+        return round(obj.current_tokens(), 2)
+
+    available_tokens.short_description = "Доступно сейчас"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Delivery)
+class DeliveryAdmin(ModelAdmin):
+    list_display = ["chat_id", "task", "outcome", "status_code", "retries", "latency_ms", "created"]
+    search_fields = ["chat_id", "task__name"]
+    search_help_text = "Telegram ID или название задачи"
+
+    list_filter_submit = True
+    list_filter = [
+        ["created", RangeDateFilter],
+        "outcome",
+        "status_code",
+    ]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Broadcast)
+class BroadcastAdmin(ModelAdmin):
+    list_display = ["pk", "short_text", "status", "progress", "created", "finished_at"]
+    list_display_links = ["pk", "short_text"]
+    search_fields = ["text"]
+    search_help_text = "Фрагмент текста рассылки"
+    actions = ["start_broadcast"]
+
+    list_filter_submit = True
+    list_filter = [
+        ["created", RangeDateFilter],
+        "status",
+    ]
+
+    fields = ["text", "chat_ids", "status", "total", "sent", "failed", "started_at", "finished_at"]
+    readonly_fields = ["status", "total", "sent", "failed", "started_at", "finished_at"]
+
+    def get_readonly_fields(self, request, obj=None):
+        # Only drafts can still be edited
+        if obj is not None and obj.status != "draft":
+            return self.fields
+        return self.readonly_fields
+
+    def pk(self, obj):
+        return f"#{obj.pk}"
+
+    pk.short_description = "ID"
+
+    def short_text(self, obj):
+        return obj.text[:50] or "—"
+
+    short_text.short_description = "Текст"
+
+    def progress(self, obj):
+        done = obj.sent + obj.failed
+        percent = round(done * 100 / obj.total) if obj.total else 0
+        return f"{done}/{obj.total} ({percent}%), ошибок: {obj.failed}"
+
+    progress.short_description = "Прогресс"
+
+    def start_broadcast(self, request, queryset):
+        count = queryset.filter(status="draft").exclude(text="").update(status="queued")
+        self.message_user(request, f"Рассылок поставлено в очередь: {count}")
+
+    start_broadcast.short_description = "Запустить рассылку"
+
+
+@admin.register(ReportJob)
+class ReportJobAdmin(ModelAdmin):
+    list_display = ["pk", "report_period", "status", "progress", "requested_by", "created", "download"]
+    list_display_links = ["pk", "report_period"]
+
+    list_filter_submit = True
+    list_filter = [
+        ["created", RangeDateFilter],
+        "status",
+    ]
+
+    def pk(self, obj):
+        return f"#{obj.pk}"
+
+    pk.short_description = "ID"
+
+    def report_period(self, obj):
+        if obj.date_from and obj.date_to:
+            return f"{obj.date_from:%d.%m.%Y} - {obj.date_to:%d.%m.%Y}"
+        return "Прошлый месяц" if obj.period == "prev_month" else "Текущий месяц"
+
+    report_period.short_description = "Период"
+
+    def download(self, obj):
+        if obj.status != "finished":
+            return "—"
+        return format_html('<a href="{}">Скачать</a>', reverse("download_report_job", args=[obj.pk]))
+
+    download.short_description = "Файл"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,119 @@
+"""
+Async versions of the bot facing views in `api.views`, served instead of
+them when ASYNC_API_VIEWS is on (see api.urls). Only worth it under an
+ASGI server, WSGI runs every async view in its own event loop.
+
+They give the same responses, ETags included, but wait on the database and
+the cache without holding a worker thread each. Paged `get_tasks` requests
+go to the sync view, DRF's paginator has no async interface.
+"""
+
+from asgiref.sync import sync_to_async
+from django.db.models import Max, Count
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, quote_etag
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from api import views
+from api.cache import aget_user_tasks
+from api.models import Brigade, Specialization, Task, User, FinishedWork, FinishedWorkPhoto
+from api.renderers import dumps
+from api.serializers import TaskSerializer, CompactTaskSerializer
+
+
+def json_response(data, status=200):
+    # Rendered like the DRF views, so clients see no difference
+    return HttpResponse(dumps(data), status=status, content_type="application/json")
+
+
+async def conditional(request, etag, respond):
+    """
+    What `condition` does for the sync views, with `etag` computed beforehand.
+    `respond` is a coroutine function building the response when it is needed.
+    """
+
+    etag = quote_etag(etag)
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = await respond()
+
+    if request.method in ("GET", "HEAD"):
+        response.headers.setdefault("ETag", etag)
+
+    return response
+
+
+async def tasks_version(request):
+    stamps = [
+        stamp async for stamp in
+        views.user_tasks(request.GET.get("telegram_id")).order_by("pk").values_list("pk", "updated")
+    ]
+    brigades = await Brigade.objects.filter(task__in=[pk for pk, _ in stamps]).aaggregate(updated=Max("updated"))
+    specializations = await Specialization.objects.aaggregate(updated=Max("updated"))
+
+    return views.tasks_fingerprint(stamps, brigades["updated"], specializations["updated"])
+
+
+@require_GET
+async def get_tasks(request):
+    telegram_id = request.GET.get("telegram_id")
+    compact, fields, unknown = views.requested_fields(request)
+
+    if unknown:
+        return views.unknown_fields_response(unknown)
+
+    if any(param in request.GET for param in ("cursor", "page_size", "deadline_before", "is_done")):
+        return await sync_to_async(views.get_tasks)(request)
+
+    async def build_compact():
+        tasks = [task async for task in views.with_compact_relations(views.user_tasks(telegram_id))]
+        return CompactTaskSerializer(tasks, many=True).data
+
+    async def build():
+        tasks = [task async for task in views.with_full_relations(views.user_tasks(telegram_id))]
+        return TaskSerializer(tasks, many=True).data
+
+    version = await tasks_version(request)
+
+    async def respond():
+        if compact:
+            tasks = await aget_user_tasks(telegram_id, build_compact, version, variant="compact")
+            return json_response([{field: task[field] for field in fields} for task in tasks])
+
+        return json_response(await aget_user_tasks(telegram_id, build, version))
+
+    return await conditional(request, views.tasks_etag(request, version), respond)
+
+
+@require_GET
+async def get_specializations(request):
+    stats = await Specialization.objects.aaggregate(count=Count("id"), updated=Max("updated"))
+
+    async def respond():
+        specializations = Specialization.objects.values_list("name", flat=True).distinct()
+        return json_response([name async for name in specializations])
+
+    return await conditional(request, views.specializations_fingerprint(stats), respond)
+
+
+@csrf_exempt
+@require_POST
+async def save_finished_task_details(request):
+    task_id = request.POST.get("task_id")
+    description = request.POST.get("description")
+    worker_telegram_id = request.POST.get("worker_telegram_id")
+    photo = request.FILES.get("photo")
+
+    finished_work = await FinishedWork.objects.acreate(
+        task=await Task.objects.aget(id=task_id),
+        description=description,
+        worker=await User.objects.aget(telegram_id=worker_telegram_id),
+    )
+    await FinishedWorkPhoto.objects.acreate(
+        finished_work=finished_work,
+        photo=photo,
+    )
+
+    return json_response({"sucess": True, "details": ""})
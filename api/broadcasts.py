@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from api import jobs
+from api.metrics import record_delivery
+from api.models import Broadcast, BotUser
+from api.ratelimit import RateLimiter
+from api.telegram import TelegramClient
+
+logger = logging.getLogger('task_logger')
+
+# How often the progress is written back to the Broadcast row, in seconds
+PROGRESS_INTERVAL = 2
+
+
+def release_stale():
+    """
+    Queue again broadcasts whose worker died mid-send, a running one saves its progress every PROGRESS_INTERVAL.
+
+    They are sent from the start, recipients reached before the crash get the message twice.
+    """
+
+    return jobs.release_stale(Broadcast, settings.BROADCAST_RUNNING_TIMEOUT, status="queued")
+
+
+def claim_broadcast():
+    """
+    Take the oldest queued broadcast, or return None if there is nothing to send
+    """
+
+    release_stale()
+    return jobs.claim_next(Broadcast)
+
+
+def get_broadcast_recipients(broadcast):
+    if broadcast.chat_ids:
+        return list(dict.fromkeys(str(chat_id) for chat_id in broadcast.chat_ids))
+
+    return list(
+        BotUser.objects
+        .filter(is_active=True)
+        .values_list("telegram_id", flat=True)
+    )
+
+
+class BroadcastSender:
+    """
+    Sends a broadcast from an asyncio loop with at most `concurrency` messages in flight.
+
+    The HTTP calls run on the pooled client in worker threads, every one of
+    them still goes through the shared rate limiter.
+    """
+
+    def __init__(self, broadcast, concurrency=None):
+        self.broadcast = broadcast
+        self.concurrency = concurrency or settings.BROADCAST_CONCURRENCY
+        self.client = TelegramClient(
+            pool_size=self.concurrency,
+            limiter=RateLimiter() if settings.TELEGRAM_RATE_LIMIT else None,
+        )
+        self.sent = 0
+        self.failed = 0
+
+    def _send(self, chat_id):
+        result = self.client.send(chat_id, self.broadcast.text)
+        record_delivery(result)
+        return result
+
+    def _save_progress(self, **fields):
+        Broadcast.objects.filter(pk=self.broadcast.pk).update(
+            sent=self.sent, failed=self.failed, updated=timezone.now(), **fields
+        )
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL)
+            await sync_to_async(self._save_progress)()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=self.concurrency))
+
+        chat_ids = await sync_to_async(get_broadcast_recipients)(self.broadcast)
+        await sync_to_async(self._save_progress)(total=len(chat_ids))
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        started = time.monotonic()
+
+        async def send(chat_id):
+            async with semaphore:
+                try:
+                    result = await loop.run_in_executor(None, self._send, chat_id)
+                except Exception as e:
+                    self.failed += 1
+                    logger.error(f"Error sending broadcast #{self.broadcast.pk} to {chat_id}: {e}")
+                    return
+
+            if result.ok:
+                self.sent += 1
+            else:
+                self.failed += 1
+                logger.error(f"Error sending broadcast #{self.broadcast.pk} to {chat_id}: {result.error}")
+
+        reporter = asyncio.create_task(self._report())
+        try:
+            await asyncio.gather(*(send(chat_id) for chat_id in chat_ids))
+        finally:
+            reporter.cancel()
+            await sync_to_async(self._save_progress)(status="finished", finished_at=timezone.now())
+
+        logger.info(
+            f"Broadcast #{self.broadcast.pk} finished in {time.monotonic() - started:.0f} s: "
+            f"{self.sent} sent, {self.failed} failed"
+        )
+
+
+def run_broadcast(broadcast, concurrency=None):
+    asyncio.run(BroadcastSender(broadcast, concurrency=concurrency).run())
@@ -0,0 +1,166 @@
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import transaction
+
+from api.models import Brigade, Task
+
+
+# The generation and the stats live in the "counters" cache, apart from the
+# cached lists, culling the default cache would otherwise reset them. Like
+# `cache`, it is looked up on every use so that overridden settings apply.
+STATS_KEYS = ("hits", "misses", "invalidations")
+
+
+def _count(name, amount=1):
+    key = f"task_cache:stats:{name}"
+    counters = caches["counters"]
+
+    try:
+        counters.incr(key, amount)
+    except ValueError:
+        counters.add(key, 0, timeout=None)
+        counters.incr(key, amount)
+
+
+async def _acount(name, amount=1):
+    key = f"task_cache:stats:{name}"
+    counters = caches["counters"]
+
+    try:
+        await counters.aincr(key, amount)
+    except ValueError:
+        await counters.aadd(key, 0, timeout=None)
+        await counters.aincr(key, amount)
+
+
+def _generation():
+    # Bumped to drop every cached list at once, e.g. when a specialization is renamed
+    return caches["counters"].get_or_set("task_cache:generation", 0, timeout=None)
+
+
+async def _ageneration():
+    return await caches["counters"].aget_or_set("task_cache:generation", 0, timeout=None)
+
+
+# Payload shapes cached separately for each user, see `get_tasks`
+VARIANTS = ("full", "compact")
+
+
+def _key(telegram_id, variant="full", generation=None):
+    # The date is part of the key since lists only contain tasks with deadline >= today
+    generation = _generation() if generation is None else generation
+    return f"task_list:{generation}:{date.today().isoformat()}:{variant}:{telegram_id}"
+
+
+def get_user_tasks(telegram_id, build, version, variant="full"):
+    """
+    Serialized task list of a user, `build` is called to produce it on a miss.
+
+    Lists are stored with the `version` (see `api.views.tasks_version`) read
+    before they were built and a list of another version counts as a miss.
+    A request finishing after an edit committed and invalidated the key can
+    store an outdated list, it is never served for the edited version.
+    """
+
+    key = _key(telegram_id, variant)
+    cached = cache.get(key)
+
+    if cached is not None and cached[0] == version:
+        _count("hits")
+        return cached[1]
+
+    _count("misses")
+    data = build()
+    cache.set(key, (version, data), timeout=settings.TASK_CACHE_TIMEOUT)
+    return data
+
+
+async def aget_user_tasks(telegram_id, build, version, variant="full"):
+    """
+    Async `get_user_tasks`, `build` is a coroutine function
+    """
+
+    key = _key(telegram_id, variant, await _ageneration())
+    cached = await cache.aget(key)
+
+    if cached is not None and cached[0] == version:
+        await _acount("hits")
+        return cached[1]
+
+    await _acount("misses")
+    data = await build()
+    await cache.aset(key, (version, data), timeout=settings.TASK_CACHE_TIMEOUT)
+    return data
+
+
+def invalidate_users(telegram_ids):
+    """
+    Drop cached lists of the given users once the current transaction commits
+    """
+
+    telegram_ids = {telegram_id for telegram_id in telegram_ids if telegram_id}
+    if not telegram_ids:
+        return
+
+    def invalidate():
+        cache.delete_many([_key(telegram_id, variant) for telegram_id in telegram_ids for variant in VARIANTS])
+        _count("invalidations", len(telegram_ids))
+
+    transaction.on_commit(invalidate)
+
+
+def invalidate_all():
+    def invalidate():
+        counters = caches["counters"]
+
+        try:
+            counters.incr("task_cache:generation")
+        except ValueError:
+            counters.set("task_cache:generation", 1, timeout=None)
+        _count("invalidations")
+
+    transaction.on_commit(invalidate)
+
+
+def brigade_members(brigade_ids):
+    """
+    Telegram IDs of the foremen and workers of the given brigades
+    """
+
+    foremen = Brigade.objects.filter(pk__in=brigade_ids).values_list("foreman__telegram_id", flat=True)
+    workers = (
+        Brigade.workers.through.objects
+        .filter(brigade_id__in=brigade_ids)
+        .values_list("worker__telegram_id", flat=True)
+    )
+    return {*foremen, *workers}
+
+
+def task_members(task_ids):
+    """
+    Telegram IDs of everyone whose task list contains one of the given tasks
+    """
+
+    return brigade_members(Task.brigades.through.objects.filter(task_id__in=task_ids).values("brigade_id"))
+
+
+def brigade_audience(brigade_ids):
+    """
+    Telegram IDs of everyone whose cached payload shows one of the given brigades.
+
+    Task payloads nest every brigade of the task, so besides the brigade's
+    own members this includes members of brigades sharing a task with it.
+    """
+
+    task_ids = Task.brigades.through.objects.filter(brigade_id__in=brigade_ids).values("task_id")
+    return brigade_members(brigade_ids) | task_members(task_ids)
+
+
+def cache_stats():
+    counters = caches["counters"]
+    stats = {name: counters.get(f"task_cache:stats:{name}", 0) for name in STATS_KEYS}
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0
+    return stats
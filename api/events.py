@@ -0,0 +1,111 @@
+"""
+Server-Sent Events of task list changes, so the bot hears about new tasks
+right away instead of polling `get_tasks` (served by `api.views.task_events`).
+
+Events are TaskEvent rows written next to TaskMembership changes (see
+`api.memberships`) and task edits (see `api.signals`), the stream polls them
+by ID. The ID is sent with every event, a reconnecting client passes it back
+as `Last-Event-ID` and resumes where it stopped.
+
+IDs are taken on insert but show up on commit, so a lower ID can appear
+after a higher one was sent. Like delta sync, the stream looks back
+TASK_SYNC_OVERLAP seconds and sends what it has not sent yet, out of ID
+order rather than never. Events are idempotent, a resumed stream may repeat
+the ones created shortly before `Last-Event-ID`.
+"""
+
+import asyncio
+import json
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Max, Prefetch, Q
+from django.utils import timezone
+
+from api.models import Task, TaskEvent, Brigade
+from api.serializers import CompactTaskSerializer
+
+
+def publish(members, kind):
+    """
+    Add a `kind` event for each `(telegram_id, task_id)` pair
+    """
+
+    TaskEvent.objects.bulk_create(
+        [TaskEvent(telegram_id=telegram_id, task_id=task_id, kind=kind) for telegram_id, task_id in members]
+    )
+
+
+def purge_events():
+    horizon = timezone.now() - timedelta(hours=settings.TASK_EVENT_RETENTION)
+    return TaskEvent.objects.filter(created__lt=horizon).delete()[0]
+
+
+def _tasks_payload(task_ids):
+    tasks = Task.objects.filter(pk__in=task_ids).prefetch_related(
+        Prefetch("brigades", queryset=Brigade.objects.only("id", "name"))
+    )
+    return {task["id"]: task for task in CompactTaskSerializer(tasks, many=True).data}
+
+
+def _format(event, task=None):
+    data = json.dumps({"task_id": event.task_id, "kind": event.kind, "task": task}, ensure_ascii=False, default=str)
+    return f"id: {event.pk}\nevent: {event.kind}\ndata: {data}\n\n"
+
+
+async def stream(telegram_id, last_event_id=None):
+    """
+    Yield events of a user after `last_event_id`, or from now on when it is not given
+    """
+
+    overlap = timedelta(seconds=settings.TASK_SYNC_OVERLAP)
+
+    if last_event_id is None:
+        last_event_id = (await TaskEvent.objects.aaggregate(last=Max("pk")))["last"] or 0
+        # Nothing created before the connection, however late it commits
+        floor = timezone.now()
+    else:
+        last_created = await TaskEvent.objects.filter(pk=last_event_id).values_list("created", flat=True).afirst()
+        floor = (last_created or timezone.now()) - overlap
+
+    # Tells EventSource clients how long to wait before reconnecting, in ms
+    yield f"retry: {settings.TASK_EVENTS_RETRY * 1000}\n\n"
+
+    started = last_sent = time.monotonic()
+    since = floor
+    # `created` of the events sent that are still in the overlap window, by ID
+    sent = {}
+
+    while time.monotonic() - started < settings.TASK_EVENTS_MAX_DURATION:
+        polled = timezone.now()
+        events = [
+            event async for event in
+            TaskEvent.objects
+            .filter(Q(pk__gt=last_event_id) | Q(created__gte=since), telegram_id=telegram_id)
+            .exclude(pk__in=list(sent))
+            .order_by("pk")[:100]
+        ]
+
+        since = max(floor, polled - overlap)
+        sent = {pk: created for pk, created in sent.items() if created >= since}
+
+        if events:
+            tasks = await sync_to_async(_tasks_payload)(
+                {event.task_id for event in events if event.kind != "removed"}
+            )
+            for event in events:
+                yield _format(event, None if event.kind == "removed" else tasks.get(event.task_id))
+                sent[event.pk] = event.created
+            last_event_id = max(last_event_id, events[-1].pk)
+            last_sent = time.monotonic()
+            continue
+
+        if time.monotonic() - last_sent >= settings.TASK_EVENTS_HEARTBEAT:
+            # Comment line, keeps proxies from closing an idle connection
+            yield ": ping\n\n"
+            last_sent = time.monotonic()
+
+        await asyncio.sleep(settings.TASK_EVENTS_POLL_INTERVAL)
+
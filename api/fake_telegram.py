@@ -0,0 +1,164 @@
+"""
+Local stand-in for the Telegram Bot API, used for offline load testing.
+
+Point `TELEGRAM_API_URL` at it (see `python manage.py fake_telegram_server`)
+and every message is recorded here instead of reaching real chats.
+"""
+
+import json
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+
+class FakeBotAPI:
+    """
+    Recorded messages, counters and the rules deciding how to answer a call
+    """
+
+    def __init__(self, latency=0, jitter=0, error_rate=0, retry_after=1, global_limit=0, chat_limit=0, keep=1000):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.global_limit = global_limit
+        self.chat_limit = chat_limit
+
+        self.lock = threading.Lock()
+        self.messages = deque(maxlen=keep)
+        self.started = time.time()
+        self.accepted = 0
+        self.rejected = 0
+        self.recent = deque()
+        self.recent_by_chat = defaultdict(deque)
+        self.message_id = 0
+
+    def _over_limit(self, chat_id, now):
+        # Sliding one second window, the same granularity Telegram documents its limits in
+        while self.recent and now - self.recent[0] > 1:
+            self.recent.popleft()
+
+        chat_recent = self.recent_by_chat[chat_id]
+        while chat_recent and now - chat_recent[0] > 1:
+            chat_recent.popleft()
+
+        if self.global_limit and len(self.recent) >= self.global_limit:
+            return True
+        if self.chat_limit and chat_id is not None and len(chat_recent) >= self.chat_limit:
+            return True
+        return False
+
+    def handle(self, method, params):
+        """
+        Answer a Bot API call, returns `(status_code, body)`
+        """
+
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        chat_id = params.get("chat_id")
+        now = time.time()
+
+        with self.lock:
+            if random.random() < self.error_rate or self._over_limit(chat_id, now):
+                self.rejected += 1
+                return 429, {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {self.retry_after}",
+                    "parameters": {"retry_after": self.retry_after},
+                }
+
+            self.accepted += 1
+            self.recent.append(now)
+            if chat_id is not None:
+                self.recent_by_chat[chat_id].append(now)
+
+            if method != "sendMessage":
+                return 200, {"ok": True, "result": True}
+
+            self.message_id += 1
+            message = {
+                "message_id": self.message_id,
+                "date": int(now),
+                "chat": {"id": chat_id},
+                "text": params.get("text"),
+            }
+            self.messages.append(message)
+
+        return 200, {"ok": True, "result": message}
+
+    def stats(self):
+        now = time.time()
+
+        with self.lock:
+            elapsed = max(now - self.started, 1e-9)
+            last_second = sum(1 for sent in self.recent if now - sent <= 1)
+
+            return {
+                "accepted": self.accepted,
+                "rejected": self.rejected,
+                "uptime": round(elapsed, 2),
+                "throughput": round(self.accepted / elapsed, 2),
+                "last_second": last_second,
+            }
+
+
+class FakeBotAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status_code, body):
+        data = json.dumps(body).encode()
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _params(self):
+        url = urlsplit(self.path)
+        params = dict(parse_qsl(url.query))
+
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            body = self.rfile.read(length)
+            if self.headers.get("Content-Type", "").startswith("application/json"):
+                params.update(json.loads(body or b"{}"))
+            else:
+                params.update(parse_qsl(body.decode()))
+
+        return url.path, params
+
+    def _dispatch(self):
+        path, params = self._params()
+        api = self.server.api
+
+        if path == "/stats":
+            return self._reply(200, api.stats())
+        if path == "/messages":
+            with api.lock:
+                return self._reply(200, list(api.messages))
+
+        # /bot<token>/<method>
+        parts = path.strip("/").split("/")
+        if len(parts) != 2 or not parts[0].startswith("bot"):
+            return self._reply(404, {"ok": False, "error_code": 404, "description": "Not Found"})
+
+        self._reply(*api.handle(parts[1], params))
+
+    do_GET = _dispatch
+    do_POST = _dispatch
+
+
+def make_server(api, host="127.0.0.1", port=8081):
+    server = ThreadingHTTPServer((host, port), FakeBotAPIHandler)
+    server.daemon_threads = True
+    server.api = api
+    return server
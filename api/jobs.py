@@ -0,0 +1,35 @@
+"""
+Queue of rows processed one at a time by a worker command, shared by
+Broadcast (`run_broadcasts`) and ReportJob (`run_report_jobs`).
+
+Rows go from "queued" to "running" when claimed. A running row has its
+`updated` bumped as the work goes on, one left untouched for too long
+belongs to a worker that died and is released by `release_stale`.
+"""
+
+from datetime import timedelta
+
+from django.utils import timezone
+
+
+def claim_next(model):
+    """
+    Mark the oldest queued row of `model` as running and return it, None if nothing is queued
+    """
+
+    for row in model.objects.filter(status="queued").order_by("created"):
+        now = timezone.now()
+        # Another worker may have taken it in between
+        if model.objects.filter(pk=row.pk, status="queued").update(status="running", started_at=now, updated=now):
+            row.refresh_from_db()
+            return row
+    return None
+
+
+def release_stale(model, timeout, **changes):
+    """
+    Apply `changes` to running rows of `model` not updated for `timeout` seconds, returns how many there were
+    """
+
+    deadline = timezone.now() - timedelta(seconds=timeout)
+    return model.objects.filter(status="running", updated__lt=deadline).update(updated=timezone.now(), **changes)
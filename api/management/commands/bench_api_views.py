@@ -0,0 +1,80 @@
+import asyncio
+import statistics
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand
+from django.db.backends.signals import connection_created
+from django.test import AsyncRequestFactory
+
+from api import views, async_views
+
+
+VIEWS = {
+    "tasks": ("/api/v1/tasks/", views.get_tasks, async_views.get_tasks),
+    "specializations": ("/api/v1/specializations/", views.get_specializations, async_views.get_specializations),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the sync and async bot views under concurrent load. Views are called the "
+        "way the ASGI handler calls them, sync ones through sync_to_async, without the network"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--view", choices=VIEWS, default="tasks")
+        parser.add_argument("--telegram-id", default="", help="User whose tasks are requested")
+        parser.add_argument("--requests", type=int, default=200, help="Requests per run")
+        parser.add_argument("--concurrency", type=int, default=20, help="Requests in flight at once")
+        parser.add_argument("--latency", type=float, default=0, help="Milliseconds added to every database query, to mimic a remote database")
+
+    def handle(self, *args, **options):
+        if options["latency"]:
+            delay = options["latency"] / 1000
+
+            def slow(execute, sql, params, many, context):
+                time.sleep(delay)
+                return execute(sql, params, many, context)
+
+            def add_latency(sender, connection, **kwargs):
+                connection.execute_wrappers.append(slow)
+
+            connection_created.connect(add_latency, weak=False)
+
+        path, sync_view, async_view = VIEWS[options["view"]]
+        factory = AsyncRequestFactory()
+        params = {"telegram_id": options["telegram_id"]} if options["view"] == "tasks" else {}
+
+        runs = {
+            # What ASGIHandler does with a sync view
+            "sync": sync_to_async(sync_view),
+            "async": async_view,
+        }
+
+        for name, view in runs.items():
+            latencies, elapsed = asyncio.run(
+                self.run(view, lambda: factory.get(path, params), options["requests"], options["concurrency"])
+            )
+            latencies.sort()
+            self.stdout.write(
+                f"{name:>5}: {len(latencies) / elapsed:8.1f} req/s, "
+                f"p50 {statistics.median(latencies) * 1000:7.1f} ms, "
+                f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:7.1f} ms"
+            )
+
+    async def run(self, view, make_request, requests, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def call():
+            async with semaphore:
+                started = time.monotonic()
+                response = await view(make_request())
+                if response.status_code != 200:
+                    raise RuntimeError(f"HTTP {response.status_code}")
+                latencies.append(time.monotonic() - started)
+
+        started = time.monotonic()
+        await asyncio.gather(*(call() for _ in range(requests)))
+        return latencies, time.monotonic() - started
@@ -0,0 +1,53 @@
+import gzip
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from api import views
+from api.middleware import brotli
+from api.renderers import ORJSONRenderer, orjson
+from api.serializers import TaskSerializer, CompactTaskSerializer
+
+
+class Command(BaseCommand):
+    help = "Time JSON rendering and compression of a user's get_tasks payload"
+
+    def add_arguments(self, parser):
+        parser.add_argument("telegram_id", help="User whose tasks are rendered")
+        parser.add_argument("--compact", action="store_true", help="Use the compact payload")
+        parser.add_argument("--repeat", type=int, default=50, help="Renders per measurement")
+
+    def measure(self, func, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            result = func()
+        return (time.perf_counter() - started) / repeat * 1000, result
+
+    def handle(self, *args, **options):
+        telegram_id, repeat = options["telegram_id"], options["repeat"]
+
+        if options["compact"]:
+            data = CompactTaskSerializer(views.with_compact_relations(views.user_tasks(telegram_id)), many=True).data
+        else:
+            data = TaskSerializer(views.with_full_relations(views.user_tasks(telegram_id)), many=True).data
+
+        self.stdout.write(f"{len(data)} tasks")
+
+        elapsed, content = self.measure(lambda: JSONRenderer().render(data), repeat)
+        self.stdout.write(f"json:     {elapsed:8.2f} ms, {len(content)} bytes")
+
+        if orjson is None:
+            self.stdout.write("orjson:   not installed")
+        else:
+            elapsed, fast = self.measure(lambda: ORJSONRenderer().render(data), repeat)
+            self.stdout.write(f"orjson:   {elapsed:8.2f} ms, {len(fast)} bytes")
+
+        elapsed, compressed = self.measure(lambda: gzip.compress(content, compresslevel=6), repeat)
+        self.stdout.write(f"gzip:     {elapsed:8.2f} ms, {len(compressed)} bytes")
+
+        if brotli is None:
+            self.stdout.write("brotli:   not installed")
+        else:
+            elapsed, compressed = self.measure(lambda: brotli.compress(content, quality=5), repeat)
+            self.stdout.write(f"brotli:   {elapsed:8.2f} ms, {len(compressed)} bytes")
@@ -0,0 +1,59 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.fake_telegram import FakeBotAPI, make_server
+
+
+class Command(BaseCommand):
+    help = "Run a local fake Telegram Bot API that records messages, for offline load testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8081)
+        parser.add_argument("--latency", type=float, default=0.05, help="Seconds to wait before answering a call")
+        parser.add_argument("--jitter", type=float, default=0, help="Random +/- seconds added to the latency")
+        parser.add_argument("--error-rate", type=float, default=0, help="Share of calls answered with 429 at random (0..1)")
+        parser.add_argument("--retry-after", type=int, default=1, help="retry_after sent with every 429")
+        parser.add_argument("--global-limit", type=int, default=30, help="Messages per second before answering 429, 0 disables")
+        parser.add_argument("--chat-limit", type=int, default=1, help="Messages per second to one chat before answering 429, 0 disables")
+        parser.add_argument("--report-interval", type=float, default=5, help="Seconds between throughput reports, 0 disables")
+
+    def handle(self, *args, **options):
+        api = FakeBotAPI(
+            latency=options["latency"],
+            jitter=options["jitter"],
+            error_rate=options["error_rate"],
+            retry_after=options["retry_after"],
+            global_limit=options["global_limit"],
+            chat_limit=options["chat_limit"],
+        )
+        server = make_server(api, host=options["host"], port=options["port"])
+
+        self.stdout.write(
+            f"Fake Bot API on http://{options['host']}:{options['port']}, "
+            f"set TELEGRAM_API_URL to it. Stats at /stats, recorded messages at /messages"
+        )
+
+        if options["report_interval"]:
+            threading.Thread(target=self.report, args=(api, options["report_interval"]), daemon=True).start()
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write(f"Stopped: {api.stats()}")
+        finally:
+            server.server_close()
+
+    def report(self, api, interval):
+        accepted = 0
+
+        while True:
+            time.sleep(interval)
+            stats = api.stats()
+            self.stdout.write(
+                f"accepted={stats['accepted']} rejected={stats['rejected']} "
+                f"rate={(stats['accepted'] - accepted) / interval:.1f}/s avg={stats['throughput']}/s"
+            )
+            accepted = stats["accepted"]
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from api.metrics import purge_deliveries
+from api.notifications import purge_sent
+
+
+class Command(BaseCommand):
+    help = "Delete notifications sent more than NOTIFICATION_RETENTION days ago and delivery records older than DELIVERY_RETENTION days"
+
+    def handle(self, *args, **options):
+        count = purge_sent()
+        self.stdout.write(f"Deleted {count} sent notifications")
+
+        count = purge_deliveries()
+        self.stdout.write(f"Deleted {count} delivery records")
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from api.events import purge_events
+from api.memberships import purge_tombstones
+
+
+class Command(BaseCommand):
+    help = "Delete task tombstones older than TASK_TOMBSTONE_RETENTION days and task events older than TASK_EVENT_RETENTION hours"
+
+    def handle(self, *args, **options):
+        count = purge_tombstones()
+        self.stdout.write(f"Deleted {count} tombstones")
+
+        count = purge_events()
+        self.stdout.write(f"Deleted {count} task events")
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.memberships import rebuild_task_memberships
+
+
+class Command(BaseCommand):
+    help = "Rebuild the telegram_id -> task membership index used by the bot task endpoints"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Tasks synced per query batch")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = rebuild_task_memberships(batch_size=options["batch_size"])
+
+        self.stdout.write(f"Synced memberships of {count} tasks")
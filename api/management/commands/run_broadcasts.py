@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.broadcasts import claim_broadcast, run_broadcast
+
+
+class Command(BaseCommand):
+    help = "Send queued admin broadcasts"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Send everything queued and exit")
+        parser.add_argument("--interval", type=float, default=5, help="Seconds to sleep when nothing is queued")
+        parser.add_argument("--concurrency", type=int, default=None, help="Messages in flight at once")
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                broadcast = claim_broadcast()
+
+                if broadcast is not None:
+                    self.stdout.write(f"Sending {broadcast}")
+                    run_broadcast(broadcast, concurrency=options["concurrency"])
+                    continue
+
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped")
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.reports import claim_report_job, run_report_job, purge_report_jobs
+
+
+class Command(BaseCommand):
+    help = "Generate queued attendance reports"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Generate everything queued and exit")
+        parser.add_argument("--interval", type=float, default=2, help="Seconds to sleep when nothing is queued")
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                job = claim_report_job()
+
+                if job is not None:
+                    self.stdout.write(f"Generating {job}")
+                    job = run_report_job(job)
+                    self.stdout.write(f"{job}: {job.status}")
+                    continue
+
+                purge_report_jobs()
+
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped")
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.notifications import dispatch_pending
+
+
+class Command(BaseCommand):
+    help = "Deliver queued Telegram notifications from the outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Drain the outbox once and exit")
+        parser.add_argument("--interval", type=float, default=2, help="Seconds to sleep when the outbox is empty")
+        parser.add_argument("--batch-size", type=int, default=100, help="Rows to take per iteration")
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                processed = dispatch_pending(batch_size=options["batch_size"])
+
+                if options["once"] and processed < options["batch_size"]:
+                    break
+
+                if not processed:
+                    time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped")
@@ -0,0 +1,154 @@
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from api.events import publish
+from api.models import Brigade, Task, TaskMembership, TaskTombstone
+
+
+def expected_memberships(task_ids):
+    """
+    `{(telegram_id, task_id): deadline}` computed from the brigades of the given tasks
+    """
+
+    foremen = (
+        Task.brigades.through.objects
+        .filter(task_id__in=task_ids)
+        .values_list("brigade__foreman__telegram_id", "task_id", "task__deadline")
+    )
+    workers = (
+        Brigade.workers.through.objects
+        .filter(brigade__task__in=task_ids)
+        .values_list("worker__telegram_id", "brigade__task", "brigade__task__deadline")
+    )
+
+    return {
+        (telegram_id, task_id): deadline
+        for telegram_id, task_id, deadline in [*foremen, *workers]
+        if telegram_id
+    }
+
+
+def sync_task_memberships(task_ids):
+    """
+    Bring the membership rows of the given tasks in line with their brigades.
+
+    Only the difference is written, rows of unchanged members are left alone.
+    """
+
+    task_ids = list(task_ids)
+    if not task_ids:
+        return
+
+    expected = expected_memberships(task_ids)
+    existing = {
+        (membership.telegram_id, membership.task_id): membership
+        for membership in TaskMembership.objects.filter(task_id__in=task_ids)
+    }
+
+    removed = [membership for key, membership in existing.items() if key not in expected]
+    added = [
+        TaskMembership(telegram_id=telegram_id, task_id=task_id, deadline=deadline)
+        for (telegram_id, task_id), deadline in expected.items()
+        if (telegram_id, task_id) not in existing
+    ]
+    moved = []
+    for key, membership in existing.items():
+        if key in expected and membership.deadline != expected[key]:
+            membership.deadline = expected[key]
+            moved.append(membership)
+
+    if removed:
+        record_tombstones(removed)
+        TaskMembership.objects.filter(pk__in=[membership.pk for membership in removed]).delete()
+    if added:
+        TaskMembership.objects.bulk_create(added, ignore_conflicts=True)
+        publish([(membership.telegram_id, membership.task_id) for membership in added], "assigned")
+    if moved:
+        TaskMembership.objects.bulk_update(moved, ["deadline"])
+
+
+def brigade_task_ids(brigade_ids):
+    return list(
+        Task.brigades.through.objects
+        .filter(brigade_id__in=brigade_ids)
+        .values_list("task_id", flat=True)
+        .distinct()
+    )
+
+
+def rebuild_task_memberships(batch_size=500):
+    """
+    Re-sync every task, returns how many were processed
+    """
+
+    task_ids = list(Task.objects.order_by("pk").values_list("pk", flat=True))
+
+    for start in range(0, len(task_ids), batch_size):
+        sync_task_memberships(task_ids[start:start + batch_size])
+
+    TaskMembership.objects.exclude(task_id__in=Task.objects.values("pk")).delete()
+    return len(task_ids)
+
+
+def record_tombstones(memberships):
+    """
+    Remember that the tasks of the given memberships left their users' lists
+    """
+
+    memberships = list(memberships)
+    TaskTombstone.objects.bulk_create(
+        [TaskTombstone(telegram_id=membership.telegram_id, task_id=membership.task_id) for membership in memberships]
+    )
+    publish([(membership.telegram_id, membership.task_id) for membership in memberships], "removed")
+
+
+def tombstone_horizon():
+    """
+    Oldest point in time removals are still known for, older sync points need a full reload
+    """
+
+    return timezone.now() - timedelta(days=settings.TASK_TOMBSTONE_RETENTION)
+
+
+def purge_tombstones():
+    return TaskTombstone.objects.filter(created__lt=tombstone_horizon()).delete()[0]
+
+
+def task_changes(telegram_id, since):
+    """
+    `(changed_ids, removed_ids)` of a user's task list since the given moment.
+
+    A task counts as changed when it, one of its brigades or a specialization
+    shown in its payload was updated, or when the user was assigned to it.
+    Tasks whose deadline was moved into the past are reported as removed,
+    tasks expiring by the passing of time are left for the client to drop.
+    """
+
+    # Rows are timestamped before their transaction commits, look back a little so none are skipped
+    since = since - timedelta(seconds=settings.TASK_SYNC_OVERLAP)
+
+    memberships = TaskMembership.objects.filter(telegram_id=telegram_id)
+    changed = set(
+        memberships.filter(
+            Q(created__gt=since)
+            | Q(task__updated__gt=since)
+            | Q(task__brigades__updated__gt=since)
+            | Q(task__brigades__foreman__specialization__updated__gt=since)
+            | Q(task__brigades__workers__specialization__updated__gt=since)
+        ).values_list("task_id", "deadline").distinct()
+    )
+
+    today = date.today()
+    changed_ids = {task_id for task_id, deadline in changed if deadline >= today}
+    removed_ids = {task_id for task_id, deadline in changed if deadline < today}
+    removed_ids.update(
+        TaskTombstone.objects
+        .filter(telegram_id=telegram_id, created__gt=since)
+        .values_list("task_id", flat=True)
+    )
+
+    # Removed and assigned again since
+    return changed_ids, removed_ids - changed_ids
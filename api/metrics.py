@@ -0,0 +1,83 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from api.models import Delivery
+
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+def record_delivery(result, task_id=None):
+    """
+    Store a `api.telegram.SendResult` as a structured delivery record
+    """
+
+    return Delivery.objects.create(
+        chat_id=str(result.chat_id),
+        task_id=task_id,
+        outcome="sent" if result.ok else "failed",
+        status_code=result.status_code,
+        retries=result.retries,
+        latency_ms=round(result.latency * 1000),
+        error=result.error,
+    )
+
+
+def purge_deliveries():
+    horizon = timezone.now() - timedelta(days=settings.DELIVERY_RETENTION)
+    return Delivery.objects.filter(created__lt=horizon).delete()[0]
+
+
+def _percentile(deliveries, total, percent):
+    if not total:
+        return None
+
+    index = min(total - 1, int(total * percent / 100))
+    return deliveries.order_by("latency_ms").values_list("latency_ms", flat=True)[index]
+
+
+def delivery_stats(since=None):
+    """
+    Counters, latency histogram and percentiles of deliveries since `since` (last 24 hours by default)
+    """
+
+    since = since or timezone.now() - timedelta(hours=24)
+    deliveries = Delivery.objects.filter(created__gte=since)
+
+    buckets = {f"le_{bound}": Count("id", filter=Q(latency_ms__lte=bound)) for bound in LATENCY_BUCKETS}
+    totals = deliveries.aggregate(
+        total=Count("id"),
+        sent=Count("id", filter=Q(outcome="sent")),
+        failed=Count("id", filter=Q(outcome="failed")),
+        retried=Count("id", filter=Q(retries__gt=0)),
+        **buckets,
+    )
+    total = totals["total"]
+
+    status_codes = dict(
+        deliveries
+        .order_by()
+        .values_list("status_code")
+        .annotate(count=Count("id"))
+    )
+
+    return {
+        "since": since.isoformat(),
+        "total": total,
+        "sent": totals["sent"],
+        "failed": totals["failed"],
+        "retried": totals["retried"],
+        "failure_rate": round(totals["failed"] / total, 4) if total else 0,
+        "status_codes": {str(code): count for code, count in status_codes.items()},
+        # Cumulative, like a Prometheus histogram
+        "latency_histogram": {
+            **{key: totals[key] for key in buckets},
+            "le_inf": total,
+        },
+        "latency_p50_ms": _percentile(deliveries, total, 50),
+        "latency_p95_ms": _percentile(deliveries, total, 95),
+    }
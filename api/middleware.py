@@ -0,0 +1,59 @@
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.regex_helper import _lazy_re_compile
+from django.utils.text import compress_string
+
+
+re_accepts_brotli = _lazy_re_compile(r"\bbr\b")
+re_accepts_gzip = _lazy_re_compile(r"\bgzip\b")
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compress JSON responses larger than COMPRESSION_MIN_SIZE bytes, with brotli
+    when it is installed and the client accepts it, gzip otherwise.
+
+    Unlike Django's GZipMiddleware it leaves streaming responses alone, so
+    the task event stream (see api.events) is not buffered.
+    """
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header("Content-Encoding"):
+            return response
+        if not response.get("Content-Type", "").startswith("application/json"):
+            return response
+        if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        accept_encoding = request.META.get("HTTP_ACCEPT_ENCODING", "")
+
+        if brotli is not None and re_accepts_brotli.search(accept_encoding):
+            content = brotli.compress(response.content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+            encoding = "br"
+        elif re_accepts_gzip.search(accept_encoding):
+            # Random padding against BREACH, like GZipMiddleware
+            content = compress_string(response.content, max_random_bytes=100)
+            encoding = "gzip"
+        else:
+            return response
+
+        # Not worth it for incompressible payloads
+        if len(content) >= len(response.content):
+            return response
+
+        response.content = content
+        response.headers["Content-Length"] = str(len(content))
+        response.headers["Content-Encoding"] = encoding
+
+        # The body changed, a strong ETag would claim byte for byte equality
+        if (etag := response.get("ETag")) and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+
+        return response
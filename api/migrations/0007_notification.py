@@ -0,0 +1,37 @@
+# Generated by Django 5.2.10 on 2026-10-18 09:33
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_user_is_active_for_sending_notifications'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chat_id', models.CharField(max_length=255, verbose_name='Telegram ID')),
+                ('text', models.TextField(verbose_name='Текст сообщения')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('sent', 'Отправлено'), ('failed', 'Ошибка')], default='pending', max_length=20, verbose_name='Статус')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попытки отправки')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='Последняя ошибка')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Отправить не раньше')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата отправки')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('task', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notifications', to='api.task', verbose_name='Задача')),
+            ],
+            options={
+                'verbose_name': 'Уведомление',
+                'verbose_name_plural': 'Уведомления',
+                'ordering': ['-created'],
+                'indexes': [models.Index(fields=['status', 'available_at'], name='api_notific_status_7e29db_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.10 on 2026-10-18 09:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_notification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True, verbose_name='Ключ')),
+                ('tokens', models.FloatField(verbose_name='Токены')),
+                ('rate', models.FloatField(verbose_name='Скорость (в секунду)')),
+                ('capacity', models.FloatField(verbose_name='Ёмкость')),
+                ('refilled_at', models.FloatField(verbose_name='Время пополнения (UNIX)')),
+            ],
+            options={
+                'verbose_name': 'Лимит отправки',
+                'verbose_name_plural': 'Лимиты отправки',
+                'ordering': ['key'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='status',
+            field=models.CharField(choices=[('pending', 'В очереди'), ('sending', 'Отправляется'), ('sent', 'Отправлено'), ('failed', 'Ошибка')], default='pending', max_length=20, verbose_name='Статус'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.10 on 2026-10-18 09:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_ratelimitbucket_alter_notification_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Delivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chat_id', models.CharField(max_length=255, verbose_name='Telegram ID')),
+                ('outcome', models.CharField(choices=[('sent', 'Отправлено'), ('failed', 'Ошибка')], max_length=20, verbose_name='Результат')),
+                ('status_code', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='HTTP статус')),
+                ('retries', models.PositiveSmallIntegerField(default=0, verbose_name='Повторы')),
+                ('latency_ms', models.PositiveIntegerField(verbose_name='Время отправки (мс)')),
+                ('error', models.TextField(blank=True, default='', verbose_name='Ошибка')),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата создания')),
+                ('task', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='deliveries', to='api.task', verbose_name='Задача')),
+            ],
+            options={
+                'verbose_name': 'Отправка',
+                'verbose_name_plural': 'Отправки',
+                'ordering': ['-created'],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.10 on 2026-10-18 09:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_delivery'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Broadcast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text', models.TextField(help_text='Поддерживается HTML разметка Telegram', verbose_name='Текст сообщения')),
+                ('chat_ids', models.JSONField(blank=True, help_text='Если пусто, рассылка уйдет всем активным пользователям бота', null=True, verbose_name='Получатели (Telegram ID)')),
+                ('status', models.CharField(choices=[('draft', 'Черновик'), ('queued', 'В очереди'), ('running', 'Отправляется'), ('finished', 'Завершена')], default='draft', max_length=20, verbose_name='Статус')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Всего получателей')),
+                ('sent', models.PositiveIntegerField(default=0, verbose_name='Отправлено')),
+                ('failed', models.PositiveIntegerField(default=0, verbose_name='Ошибок')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Начало отправки')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Конец отправки')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Рассылка',
+                'verbose_name_plural': 'Рассылки',
+                'ordering': ['-created'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-18 09:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_broadcast'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='lang',
+            field=models.CharField(default='uz', max_length=2, verbose_name='Язык'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-18 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_notification_lang'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='brigade',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата обновления'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.10 on 2026-10-18 09:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_memberships(apps, schema_editor):
+    Task = apps.get_model("api", "Task")
+    Brigade = apps.get_model("api", "Brigade")
+    TaskMembership = apps.get_model("api", "TaskMembership")
+
+    foremen = Task.brigades.through.objects.values_list("brigade__foreman__telegram_id", "task_id", "task__deadline")
+    workers = Brigade.workers.through.objects.filter(brigade__task__isnull=False).values_list(
+        "worker__telegram_id", "brigade__task", "brigade__task__deadline"
+    )
+    memberships = {
+        (telegram_id, task_id): deadline
+        for telegram_id, task_id, deadline in [*foremen, *workers]
+        if telegram_id
+    }
+
+    TaskMembership.objects.bulk_create(
+        [
+            TaskMembership(telegram_id=telegram_id, task_id=task_id, deadline=deadline)
+            for (telegram_id, task_id), deadline in memberships.items()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_alter_brigade_updated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskMembership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('telegram_id', models.CharField(max_length=255, verbose_name='Telegram ID')),
+                ('deadline', models.DateField(verbose_name='Дедлайн')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='api.task', verbose_name='Задача')),
+            ],
+            options={
+                'verbose_name': 'Участник задачи',
+                'verbose_name_plural': 'Участники задач',
+                'indexes': [models.Index(fields=['telegram_id', 'deadline'], name='api_taskmem_telegra_c5d343_idx')],
+                'constraints': [models.UniqueConstraint(fields=('telegram_id', 'task'), name='unique_task_membership')],
+            },
+        ),
+        migrations.RunPython(populate_memberships, migrations.RunPython.noop),
+    ]
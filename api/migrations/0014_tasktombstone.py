@@ -0,0 +1,27 @@
+# Generated by Django 5.2.10 on 2026-10-18 09:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_taskmembership'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('telegram_id', models.CharField(max_length=255, verbose_name='Telegram ID')),
+                ('task_id', models.BigIntegerField(verbose_name='ID задачи')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'Удаленная задача',
+                'verbose_name_plural': 'Удаленные задачи',
+                'indexes': [models.Index(fields=['telegram_id', 'created'], name='api_tasktom_telegra_b0588e_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.10 on 2026-10-18 09:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_tasktombstone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('telegram_id', models.CharField(max_length=255, verbose_name='Telegram ID')),
+                ('task_id', models.BigIntegerField(verbose_name='ID задачи')),
+                ('kind', models.CharField(choices=[('assigned', 'Назначена'), ('updated', 'Изменена'), ('removed', 'Снята')], max_length=20, verbose_name='Событие')),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'Событие задачи',
+                'verbose_name_plural': 'События задач',
+                'indexes': [models.Index(fields=['telegram_id', 'id'], name='api_taskeve_telegra_039e7f_idx')],
+            },
+        ),
+    ]
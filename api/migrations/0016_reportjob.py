@@ -0,0 +1,39 @@
+# Generated by Django 5.2.10 on 2026-10-18 10:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_taskevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_from', models.DateField(blank=True, null=True, verbose_name='С даты')),
+                ('date_to', models.DateField(blank=True, null=True, verbose_name='По дату')),
+                ('period', models.CharField(blank=True, help_text='Если даты не указаны: current_month или prev_month', max_length=20, null=True, verbose_name='Период')),
+                ('status', models.CharField(choices=[('queued', 'В очереди'), ('running', 'Формируется'), ('finished', 'Готов'), ('failed', 'Ошибка')], default='queued', max_length=20, verbose_name='Статус')),
+                ('progress', models.PositiveSmallIntegerField(default=0, verbose_name='Прогресс, %')),
+                ('file', models.FileField(blank=True, null=True, upload_to='reports/', verbose_name='Файл')),
+                ('filename', models.CharField(blank=True, default='', max_length=255, verbose_name='Имя файла')),
+                ('error', models.TextField(blank=True, default='', verbose_name='Ошибка')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Начало формирования')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Конец формирования')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='report_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Запросил')),
+            ],
+            options={
+                'verbose_name': 'Отчет',
+                'verbose_name_plural': 'Отчеты',
+                'ordering': ['-created'],
+            },
+        ),
+    ]
@@ -1,3 +1,5 @@
+import time
+
 from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 from django.contrib.auth.hashers import make_password
@@ -21,6 +23,7 @@ DOCUMENT_TYPES = (
 from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 from django.contrib.auth.hashers import make_password
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from .managers import UserManager, ForemanManager, WorkerManager
@@ -37,6 +40,38 @@ DOCUMENT_TYPES = (
     ('id_card', _("ID карта")),
 )
 
+BROADCAST_STATUSES = (
+    ('draft', _("Черновик")),
+    ('queued', _("В очереди")),
+    ('running', _("Отправляется")),
+    ('finished', _("Завершена")),
+)
+
+DELIVERY_OUTCOMES = (
+    ('sent', _("Отправлено")),
+    ('failed', _("Ошибка")),
+)
+
+NOTIFICATION_STATUSES = (
+    ('pending', _("В очереди")),
+    ('sending', _("Отправляется")),
+    ('sent', _("Отправлено")),
+    ('failed', _("Ошибка")),
+)
+
+REPORT_JOB_STATUSES = (
+    ('queued', _("В очереди")),
+    ('running', _("Формируется")),
+    ('finished', _("Готов")),
+    ('failed', _("Ошибка")),
+)
+
+TASK_EVENT_KINDS = (
+    ('assigned', _("Назначена")),
+    ('updated', _("Изменена")),
+    ('removed', _("Снята")),
+)
+
 
 class BotUser(models.Model):
     id = models.AutoField(primary_key=True)
@@ -251,7 +286,7 @@ class Brigade(models.Model):
         blank=True,
     )
     created = models.DateTimeField(verbose_name=_("Дата создания"), auto_now_add=True)
-    updated = models.DateTimeField(verbose_name=_("Дата обновления"), auto_now_add=True)
+    updated = models.DateTimeField(verbose_name=_("Дата обновления"), auto_now=True)
 
     class Meta:
         verbose_name = _("Бригада")
@@ -431,3 +466,216 @@ class Freshman(models.Model):
         ordering = ["-created"]
         verbose_name = _("Кандидат")
         verbose_name_plural = _("Кандидаты")
+
+
+class Notification(models.Model):
+    """
+    Outbox of Telegram messages, written in the same transaction as the change
+    that caused them and delivered later by the `send_notifications` command
+    """
+
+    STATUSES = NOTIFICATION_STATUSES
+
+    chat_id = models.CharField(verbose_name=_("Telegram ID"), max_length=255)
+    lang = models.CharField(verbose_name=_("Язык"), max_length=2, default='uz')
+    text = models.TextField(verbose_name=_("Текст сообщения"))
+    task = models.ForeignKey(verbose_name=_("Задача"), to=Task, on_delete=models.SET_NULL, null=True, blank=True, related_name="notifications")
+    status = models.CharField(verbose_name=_("Статус"), max_length=20, choices=NOTIFICATION_STATUSES, default='pending')
+    attempts = models.PositiveSmallIntegerField(verbose_name=_("Попытки отправки"), default=0)
+    last_error = models.TextField(verbose_name=_("Последняя ошибка"), blank=True, default="")
+    available_at = models.DateTimeField(verbose_name=_("Отправить не раньше"), default=timezone.now)
+    sent_at = models.DateTimeField(verbose_name=_("Дата отправки"), null=True, blank=True)
+    created = models.DateTimeField(verbose_name=_("Дата создания"), auto_now_add=True)
+    updated = models.DateTimeField(verbose_name=_("Дата обновления"), auto_now=True)
+
+    def __str__(self):
+        return f"{_('Уведомление')} #{self.pk} - {self.chat_id}"
+
+    class Meta:
+        ordering = ["-created"]
+        verbose_name = _("Уведомление")
+        verbose_name_plural = _("Уведомления")
+        indexes = [
+            models.Index(fields=["status", "available_at"]),
+        ]
+
+
+class RateLimitBucket(models.Model):
+    """
+    State of a token bucket used to pace Telegram traffic, see `api.ratelimit`
+    """
+
+    key = models.CharField(verbose_name=_("Ключ"), max_length=255, unique=True)
+    tokens = models.FloatField(verbose_name=_("Токены"))
+    rate = models.FloatField(verbose_name=_("Скорость (в секунду)"))
+    capacity = models.FloatField(verbose_name=_("Ёмкость"))
+    refilled_at = models.FloatField(verbose_name=_("Время пополнения (UNIX)"))
+
+    def current_tokens(self, now=None):
+        now = time.time() if now is None else now
+        return min(self.capacity, self.tokens + max(0, now - self.refilled_at) * self.rate)
+
+    def __str__(self):
+        return self.key
+
+    class Meta:
+        ordering = ["key"]
+        verbose_name = _("Лимит отправки")
+        verbose_name_plural = _("Лимиты отправки")
+
+
+class Delivery(models.Model):
+    """
+    One attempt to deliver a message through the Bot API, aggregated by `api.metrics`
+    """
+
+    OUTCOMES = DELIVERY_OUTCOMES
+
+    chat_id = models.CharField(verbose_name=_("Telegram ID"), max_length=255)
+    task = models.ForeignKey(verbose_name=_("Задача"), to=Task, on_delete=models.SET_NULL, null=True, blank=True, related_name="deliveries")
+    outcome = models.CharField(verbose_name=_("Результат"), max_length=20, choices=DELIVERY_OUTCOMES)
+    status_code = models.PositiveSmallIntegerField(verbose_name=_("HTTP статус"), null=True, blank=True)
+    retries = models.PositiveSmallIntegerField(verbose_name=_("Повторы"), default=0)
+    latency_ms = models.PositiveIntegerField(verbose_name=_("Время отправки (мс)"))
+    error = models.TextField(verbose_name=_("Ошибка"), blank=True, default="")
+    created = models.DateTimeField(verbose_name=_("Дата создания"), auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.chat_id} - {self.get_outcome_display()} - {self.latency_ms} ms"
+
+    class Meta:
+        ordering = ["-created"]
+        verbose_name = _("Отправка")
+        verbose_name_plural = _("Отправки")
+
+
+class Broadcast(models.Model):
+    """
+    Announcement sent to many bot users at once by the `run_broadcasts` command
+    """
+
+    STATUSES = BROADCAST_STATUSES
+
+    text = models.TextField(verbose_name=_("Текст сообщения"), help_text=_("Поддерживается HTML разметка Telegram"))
+    chat_ids = models.JSONField(verbose_name=_("Получатели (Telegram ID)"), null=True, blank=True, help_text=_("Если пусто, рассылка уйдет всем активным пользователям бота"))
+    status = models.CharField(verbose_name=_("Статус"), max_length=20, choices=BROADCAST_STATUSES, default='draft')
+    total = models.PositiveIntegerField(verbose_name=_("Всего получателей"), default=0)
+    sent = models.PositiveIntegerField(verbose_name=_("Отправлено"), default=0)
+    failed = models.PositiveIntegerField(verbose_name=_("Ошибок"), default=0)
+    started_at = models.DateTimeField(verbose_name=_("Начало отправки"), null=True, blank=True)
+    finished_at = models.DateTimeField(verbose_name=_("Конец отправки"), null=True, blank=True)
+    created = models.DateTimeField(verbose_name=_("Дата создания"), auto_now_add=True)
+    updated = models.DateTimeField(verbose_name=_("Дата обновления"), auto_now=True)
+
+    def __str__(self):
+        return f"{_('Рассылка')} #{self.pk}"
+
+    class Meta:
+        ordering = ["-created"]
+        verbose_name = _("Рассылка")
+        verbose_name_plural = _("Рассылки")
+
+
+class TaskMembership(models.Model):
+    """
+    Who a Task is assigned to, flattened from Task.brigades, Brigade.foreman and
+    Brigade.workers so a user's tasks are one indexed range scan.
+
+    Kept in sync by `api.signals`, `python manage.py rebuild_task_memberships` rebuilds it.
+    """
+
+    telegram_id = models.CharField(verbose_name=_("Telegram ID"), max_length=255)
+    task = models.ForeignKey(verbose_name=_("Задача"), to=Task, on_delete=models.CASCADE, related_name="memberships")
+    deadline = models.DateField(verbose_name=_("Дедлайн"))
+    created = models.DateTimeField(verbose_name=_("Дата создания"), auto_now_add=True)
+    updated = models.DateTimeField(verbose_name=_("Дата обновления"), auto_now=True)
+
+    def __str__(self):
+        return f"{self.telegram_id} - {self.task_id}"
+
+    class Meta:
+        verbose_name = _("Участник задачи")
+        verbose_name_plural = _("Участники задач")
+        constraints = [
+            models.UniqueConstraint(fields=["telegram_id", "task"], name="unique_task_membership"),
+        ]
+        indexes = [
+            models.Index(fields=["telegram_id", "deadline"]),
+        ]
+
+
+class TaskTombstone(models.Model):
+    """
+    A Task leaving a user's list, because it was deleted or the user is no longer
+    in its brigades. Lets `tasks/changes/` report removals, pruned after
+    TASK_TOMBSTONE_RETENTION days by `python manage.py purge_task_tombstones`.
+    """
+
+    telegram_id = models.CharField(verbose_name=_("Telegram ID"), max_length=255)
+    # Not a foreign key, the task may be gone
+    task_id = models.BigIntegerField(verbose_name=_("ID задачи"))
+    created = models.DateTimeField(verbose_name=_("Дата создания"), auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.telegram_id} - {self.task_id}"
+
+    class Meta:
+        verbose_name = _("Удаленная задача")
+        verbose_name_plural = _("Удаленные задачи")
+        indexes = [
+            models.Index(fields=["telegram_id", "created"]),
+        ]
+
+
+class TaskEvent(models.Model):
+    """
+    Change of a user's task list, streamed to the bot by `api.events`.
+    The auto incrementing ID doubles as the SSE event ID.
+    """
+
+    telegram_id = models.CharField(verbose_name=_("Telegram ID"), max_length=255)
+    # Not a foreign key, removal events outlive the task
+    task_id = models.BigIntegerField(verbose_name=_("ID задачи"))
+    kind = models.CharField(verbose_name=_("Событие"), max_length=20, choices=TASK_EVENT_KINDS)
+    created = models.DateTimeField(verbose_name=_("Дата создания"), auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.telegram_id} - {self.task_id} ({self.kind})"
+
+    class Meta:
+        verbose_name = _("Событие задачи")
+        verbose_name_plural = _("События задач")
+        indexes = [
+            models.Index(fields=["telegram_id", "id"]),
+        ]
+
+
+class ReportJob(models.Model):
+    """
+    Attendance report generated in the background by the `run_report_jobs` command,
+    for ranges too long to build within a request
+    """
+
+    STATUSES = REPORT_JOB_STATUSES
+
+    date_from = models.DateField(verbose_name=_("С даты"), null=True, blank=True)
+    date_to = models.DateField(verbose_name=_("По дату"), null=True, blank=True)
+    period = models.CharField(verbose_name=_("Период"), max_length=20, null=True, blank=True, help_text=_("Если даты не указаны: current_month или prev_month"))
+    status = models.CharField(verbose_name=_("Статус"), max_length=20, choices=REPORT_JOB_STATUSES, default='queued')
+    progress = models.PositiveSmallIntegerField(verbose_name=_("Прогресс, %"), default=0)
+    file = models.FileField(verbose_name=_("Файл"), upload_to="reports/", null=True, blank=True)
+    filename = models.CharField(verbose_name=_("Имя файла"), max_length=255, blank=True, default="")
+    error = models.TextField(verbose_name=_("Ошибка"), blank=True, default="")
+    requested_by = models.ForeignKey(verbose_name=_("Запросил"), to=User, on_delete=models.SET_NULL, null=True, blank=True, related_name="report_jobs")
+    started_at = models.DateTimeField(verbose_name=_("Начало формирования"), null=True, blank=True)
+    finished_at = models.DateTimeField(verbose_name=_("Конец формирования"), null=True, blank=True)
+    created = models.DateTimeField(verbose_name=_("Дата создания"), auto_now_add=True)
+    updated = models.DateTimeField(verbose_name=_("Дата обновления"), auto_now=True)
+
+    def __str__(self):
+        return f"{_('Отчет')} #{self.pk}"
+
+    class Meta:
+        ordering = ["-created"]
+        verbose_name = _("Отчет")
+        verbose_name_plural = _("Отчеты")
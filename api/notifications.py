@@ -0,0 +1,287 @@
+import logging
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from api.metrics import record_delivery
+from api.models import Notification, Brigade, BotUser
+from api.telegram import get_client
+from api.translations import build_digest_message
+
+logger = logging.getLogger('task_logger')
+
+# Telegram refuses longer messages, digests are split to stay under it
+MESSAGE_LENGTH_LIMIT = 4096
+
+
+def enqueue(chat_id, text, task=None, lang="uz"):
+    """
+    Build an unsaved outbox row, callers are expected to `bulk_create` them
+    """
+
+    return Notification(chat_id=str(chat_id), text=text, task=task, lang=lang)
+
+
+def get_task_recipients(brigade_ids):
+    """
+    Active foremen and workers of the given brigades as `(telegram_id, full_name)` pairs.
+
+    Runs two queries no matter how many brigades or workers there are.
+    """
+
+    foremen = (
+        Brigade.objects
+        .filter(pk__in=brigade_ids, foreman__is_active=True)
+        .values_list("foreman__telegram_id", "foreman__first_name", "foreman__last_name")
+    )
+    workers = (
+        Brigade.workers.through.objects
+        .filter(brigade_id__in=brigade_ids, worker__role="worker", worker__is_active=True)
+        .values_list("worker__telegram_id", "worker__first_name", "worker__last_name")
+    )
+
+    return [
+        (telegram_id, f"{first_name} {last_name}")
+        for telegram_id, first_name, last_name in [*foremen, *workers]
+    ]
+
+
+def unique_recipients(recipients, task=None):
+    """
+    Drop repeated telegram IDs (a worker may sit in several brigades) and, for
+    a Task, those already queued for it within `NOTIFICATION_DEDUP_WINDOW`
+    """
+
+    unique = {}
+    for telegram_id, full_name in recipients:
+        unique.setdefault(telegram_id, full_name)
+
+    if task is not None and settings.NOTIFICATION_DEDUP_WINDOW and unique:
+        since = timezone.now() - timedelta(seconds=settings.NOTIFICATION_DEDUP_WINDOW)
+        queued = (
+            Notification.objects
+            .filter(task=task, created__gte=since, chat_id__in=list(unique))
+            .exclude(status="failed")
+            .values_list("chat_id", flat=True)
+        )
+        for chat_id in queued:
+            unique.pop(chat_id, None)
+
+    return list(unique.items())
+
+
+def get_languages(telegram_ids):
+    """
+    Map telegram IDs to the language chosen in the bot, in a single query
+    """
+
+    return dict(
+        BotUser.objects
+        .filter(telegram_id__in=set(telegram_ids))
+        .values_list("telegram_id", "lang")
+    )
+
+
+def _lock_options():
+    # Several dispatchers may run at once, let them skip rows another one is claiming
+    if connection.features.has_select_for_update_skip_locked:
+        return {"skip_locked": True}
+    return {}
+
+
+def _pending():
+    return Notification.objects.filter(status="pending", available_at__lte=timezone.now())
+
+
+def release_stale():
+    """
+    Put back rows claimed by a dispatcher that died before recording the outcome
+    """
+
+    deadline = timezone.now() - timedelta(seconds=settings.NOTIFICATION_SENDING_TIMEOUT)
+    return Notification.objects.filter(status="sending", updated__lt=deadline).update(status="pending")
+
+
+def purge_sent():
+    """
+    Delete rows sent more than `NOTIFICATION_RETENTION` days ago, failed ones are kept for inspection
+    """
+
+    horizon = timezone.now() - timedelta(days=settings.NOTIFICATION_RETENTION)
+    return Notification.objects.filter(status="sent", sent_at__lt=horizon).delete()[0]
+
+
+def _due():
+    """
+    Rows that can be sent now.
+
+    In digest mode task messages wait until the oldest one queued for the
+    chat is `NOTIFICATION_DIGEST_WINDOW` seconds old, so the ones queued in
+    between go out together as one message.
+    """
+
+    window = settings.NOTIFICATION_DIGEST_WINDOW
+    if not window:
+        return _pending()
+
+    ready_chats = (
+        _pending()
+        .filter(task__isnull=False)
+        .values("chat_id")
+        .annotate(oldest=Min("created"))
+        .filter(oldest__lte=timezone.now() - timedelta(seconds=window))
+        .values("chat_id")
+    )
+    return _pending().filter(Q(task__isnull=True) | Q(chat_id__in=ready_chats))
+
+
+def claim(batch_size):
+    """
+    Mark up to `batch_size` due rows as being sent and return them.
+
+    The claim is committed right away, so no row lock is held while talking to Telegram.
+    """
+
+    with transaction.atomic():
+        ids = list(
+            _due()
+            .select_for_update(**_lock_options())
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        Notification.objects.filter(pk__in=ids).update(status="sending", updated=timezone.now())
+
+    return list(Notification.objects.filter(pk__in=ids).order_by("id"))
+
+
+def renew_claim(ids, claimed_at):
+    """
+    Bump `updated` of the claimed rows so `release_stale` leaves them alone
+    while a slow batch is still being sent.
+
+    Only rows still carrying this dispatcher's `claimed_at` are touched, a
+    row released and claimed by another dispatcher in the meantime is not
+    ours anymore. Returns the IDs still held and the new claim time.
+    """
+
+    now = timezone.now()
+    Notification.objects.filter(pk__in=ids, status="sending", updated=claimed_at).update(updated=now)
+    held = Notification.objects.filter(pk__in=ids, status="sending", updated=now).values_list("id", flat=True)
+    return set(held), now
+
+
+def group(notifications):
+    """
+    Split claimed rows into messages to send.
+
+    Outside of digest mode every row is its own message, in digest mode task
+    rows of the same chat are combined while they fit into one message.
+    """
+
+    if not settings.NOTIFICATION_DIGEST_WINDOW:
+        return [[notification] for notification in notifications]
+
+    by_chat = defaultdict(list)
+    groups = []
+
+    for notification in notifications:
+        if notification.task_id is None:
+            groups.append([notification])
+        else:
+            by_chat[notification.chat_id].append(notification)
+
+    for rows in by_chat.values():
+        current, length = [], 0
+
+        for row in rows:
+            # Some room is left for the digest header and separators
+            if current and length + len(row.text) + 100 > MESSAGE_LENGTH_LIMIT:
+                groups.append(current)
+                current, length = [], 0
+
+            current.append(row)
+            length += len(row.text) + 20
+
+        groups.append(current)
+
+    return groups
+
+
+def deliver(notifications):
+    """
+    Send claimed outbox rows as one message and record the outcome on all of them
+    """
+
+    first = notifications[0]
+
+    if len(notifications) == 1:
+        text = first.text
+    else:
+        text = build_digest_message(first.lang, [notification.text for notification in notifications])
+
+    result = get_client().send(chat_id=first.chat_id, text=text)
+    record_delivery(result, task_id=first.task_id if len(notifications) == 1 else None)
+
+    for notification in notifications:
+        notification.attempts += 1
+
+        if not result.ok:
+            notification.last_error = result.error
+
+            if notification.attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+                notification.status = "failed"
+            else:
+                # Linear backoff, Telegram problems rarely fix themselves in a second
+                delay = settings.NOTIFICATION_RETRY_DELAY * notification.attempts
+                notification.status = "pending"
+                notification.available_at = timezone.now() + timedelta(seconds=delay)
+
+            notification.save(update_fields=["attempts", "last_error", "status", "available_at", "updated"])
+        else:
+            notification.status = "sent"
+            notification.sent_at = timezone.now()
+            notification.save(update_fields=["attempts", "status", "sent_at", "updated"])
+
+    if not result.ok:
+        logger.error(f"Error sending message to {first.chat_id}: {result.error}")
+        return False
+
+    logger.info(f"Message sent to {first.chat_id} in {result.latency * 1000:.0f} ms ({len(notifications)} notifications)")
+    return True
+
+
+def dispatch_pending(batch_size=100):
+    """
+    Drain up to `batch_size` due outbox rows, returns how many were processed.
+
+    Rows are marked as sent one message at a time, so a crash in the middle
+    of a fan-out leaves the rest claimed and `release_stale` puts them back
+    in the queue. The claim on the rest is renewed well before it would go
+    stale, and anything another dispatcher took over anyway is skipped.
+    """
+
+    release_stale()
+    notifications = claim(batch_size)
+    if not notifications:
+        return 0
+
+    held = {notification.pk for notification in notifications}
+    claimed_at = notifications[0].updated
+    renewed = time.monotonic()
+
+    for notifications_group in group(notifications):
+        if time.monotonic() - renewed >= settings.NOTIFICATION_SENDING_TIMEOUT / 3:
+            held, claimed_at = renew_claim(held, claimed_at)
+            renewed = time.monotonic()
+
+        notifications_group = [notification for notification in notifications_group if notification.pk in held]
+        if notifications_group:
+            deliver(notifications_group)
+            held -= {notification.pk for notification in notifications_group}
+
+    return len(notifications)
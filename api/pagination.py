@@ -0,0 +1,17 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class TaskCursorPagination(CursorPagination):
+    """
+    Pages through tasks by deadline. A cursor keeps its place while tasks are
+    added or finished, unlike page numbers, and each page is a bounded index
+    range query no matter how deep the bot pages.
+    """
+
+    ordering = ("deadline", "id")
+    page_size_query_param = "page_size"
+
+    def __init__(self):
+        self.page_size = settings.TASK_PAGE_SIZE
+        self.max_page_size = settings.TASK_MAX_PAGE_SIZE
@@ -0,0 +1,87 @@
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from api.models import RateLimitBucket
+
+
+class TokenBucket:
+    """
+    Token bucket kept in the database, so every process sending to Telegram shares it.
+
+    `reserve` takes a token right away, letting the balance go negative, and
+    returns how long the caller has to wait before using it. That way a
+    bucket is touched once per message and waiting happens outside of the
+    transaction.
+    """
+
+    def __init__(self, key, rate, capacity):
+        self.key = key
+        self.rate = rate
+        self.capacity = capacity
+
+    def reserve(self):
+        now = time.time()
+
+        with transaction.atomic():
+            bucket, created = (
+                RateLimitBucket.objects
+                .select_for_update()
+                .get_or_create(
+                    key=self.key,
+                    defaults={"tokens": self.capacity, "rate": self.rate, "capacity": self.capacity, "refilled_at": now},
+                )
+            )
+
+            tokens = min(self.capacity, bucket.tokens + max(0, now - bucket.refilled_at) * self.rate) - 1
+
+            bucket.tokens = tokens
+            bucket.rate = self.rate
+            bucket.capacity = self.capacity
+            bucket.refilled_at = now
+            bucket.save(update_fields=["tokens", "rate", "capacity", "refilled_at"])
+
+        return max(0, -tokens / self.rate)
+
+
+class RateLimiter:
+    """
+    Paces outgoing messages with a global bucket and one bucket per chat
+    """
+
+    def __init__(self, global_rate=None, chat_rate=None):
+        self.global_rate = global_rate or settings.TELEGRAM_GLOBAL_RATE
+        self.chat_rate = chat_rate or settings.TELEGRAM_CHAT_RATE
+
+    def wait(self, chat_id=None):
+        delays = [TokenBucket("global", self.global_rate, self.global_rate).reserve()]
+
+        if chat_id is not None:
+            delays.append(TokenBucket(f"chat:{chat_id}", self.chat_rate, 1).reserve())
+
+        delay = max(delays)
+        if delay:
+            time.sleep(delay)
+        return delay
+
+
+def get_bucket_state(keys=None):
+    """
+    Current balance of the buckets, refilled up to now, for monitoring
+    """
+
+    now = time.time()
+    buckets = RateLimitBucket.objects.all()
+
+    if keys is not None:
+        buckets = buckets.filter(key__in=keys)
+
+    return {
+        bucket.key: {
+            "tokens": round(bucket.current_tokens(now), 2),
+            "rate": bucket.rate,
+            "capacity": bucket.capacity,
+        }
+        for bucket in buckets
+    }
@@ -0,0 +1,40 @@
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.renderers import JSONRenderer
+
+
+_encoder = JSONEncoder()
+
+
+def dumps(data):
+    """
+    Compact JSON bytes, through orjson when it is installed
+    """
+
+    if orjson is None:
+        return JSONRenderer().render(data)
+
+    # DRF's encoder covers what orjson does not know, e.g. Decimal and lazy translations
+    content = orjson.dumps(data, default=_encoder.default, option=orjson.OPT_NON_STR_KEYS)
+
+    # Escaped by JSONRenderer too, so the output stays a strict JavaScript subset
+    if b"\xe2\x80\xa8" in content or b"\xe2\x80\xa9" in content:
+        content = content.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+    return content
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer writing with orjson, several times faster on large task lists.
+    Falls back to the stock renderer when orjson is missing or indented output is asked for.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        return dumps(data)
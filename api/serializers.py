@@ -1,4 +1,4 @@
-from rest_framework.serializers import ModelSerializer
+from rest_framework.serializers import ModelSerializer, SlugRelatedField
 
 from api.models import Task, Brigade, User, Specialization
 
@@ -31,3 +31,29 @@ class TaskSerializer(ModelSerializer):
     class Meta:
         model = Task
         fields = "__all__"
+
+
+class DynamicFieldsModelSerializer(ModelSerializer):
+    """
+    Takes an extra `fields` argument limiting which of the declared fields are returned
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop("fields", None)
+        super().__init__(*args, **kwargs)
+
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class CompactTaskSerializer(DynamicFieldsModelSerializer):
+    """
+    Only what the bot shows for a task, brigades are listed by name
+    """
+
+    brigades = SlugRelatedField(many=True, read_only=True, slug_field="name")
+
+    class Meta:
+        model = Task
+        fields = ["id", "name", "description", "deadline", "is_done", "brigades"]
@@ -1,13 +1,18 @@
 import logging
 
 from django.db.models.signals import m2m_changed
-from django.db.models.signals import post_save, pre_delete
+from django.db.models.signals import post_save, pre_save, pre_delete, post_delete
+from django.db.models import Q
 from django.dispatch import receiver
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
-from api.models import Task, BotUser, Worker, User
-from api.telegram import send_message
-from api.translations import build_task_message
+from api.cache import invalidate_users, invalidate_all, brigade_members, brigade_audience, task_members
+from api.events import publish
+from api.memberships import sync_task_memberships, brigade_task_ids, record_tombstones
+from api.models import Task, BotUser, Worker, Foreman, User, Brigade, Notification, Specialization, TaskMembership
+from api.notifications import enqueue, get_task_recipients, unique_recipients, get_languages
+from api.translations import build_task_message_for
 
 logger = logging.getLogger('task_logger')
 
@@ -15,44 +20,235 @@ logger = logging.getLogger('task_logger')
 @receiver(m2m_changed, sender=Task.brigades.through)
 def task_brigades_changed(sender, instance, action, pk_set, **kwargs):
     """
-    Send messages when brigades are assigned to a Task.
+    Queue messages when brigades are assigned to a Task.
+
+    Messages are only written to the outbox here, in the same transaction as the
+    assignment, and are delivered by the `send_notifications` command.
     """
     if action == "post_add":
-        brigades = instance.brigades.filter(pk__in=pk_set)
-
-        for brigade in brigades:
-            # Foreman
-            foreman = brigade.foreman
-
-            if foreman.is_active:
-                try:
-                    lang = BotUser.objects.get(telegram_id=foreman.telegram_id).lang
-                    text = build_task_message(
-                        lang=lang,
-                        title=instance.name,
-                        description=(instance.description[:100] + "..." if len(instance.description) > 100 else instance.description),
-                        deadline=instance.deadline.strftime("%d-%m-%Y")
-                    )
-                    send_message(chat_id=foreman.telegram_id, text=text)
-                    logger.info(f"Message sent to foreman {foreman.first_name} {foreman.last_name}")
-                except Exception as e:
-                    logger.error(f"Error sending message to foreman {foreman.first_name}: {e}")
-
-            # Workers
-            for worker in brigade.workers.all():
-                if worker.is_active:
-                    try:
-                        lang = BotUser.objects.get(telegram_id=worker.telegram_id).lang
-                        text = build_task_message(
-                            lang=lang,
-                            title=instance.name,
-                            description=(instance.description[:100] + "..." if len(instance.description) > 100 else instance.description),
-                            deadline=instance.deadline.strftime("%d-%m-%Y")
-                        )
-                        send_message(chat_id=worker.telegram_id, text=text)
-                        logger.info(f"Message sent to worker {worker.first_name} {worker.last_name}")
-                    except Exception as e:
-                        logger.error(f"Error sending message to worker {worker.first_name}: {e}")
+        recipients = unique_recipients(get_task_recipients(pk_set), task=instance)
+        languages = get_languages(telegram_id for telegram_id, full_name in recipients)
+        notifications = []
+
+        for telegram_id, full_name in recipients:
+            lang = languages.get(telegram_id)
+
+            if lang is None:
+                logger.error(f"Error queueing message to {full_name}: bot user {telegram_id} not found")
+                continue
+
+            text = build_task_message_for(instance, lang)
+            notifications.append(enqueue(chat_id=telegram_id, text=text, task=instance, lang=lang))
+
+        Notification.objects.bulk_create(notifications)
+        logger.info(f"Queued {len(notifications)} messages for task #{instance.pk}")
+
+
+@receiver(m2m_changed, sender=Task.brigades.through)
+def touch_task_on_brigades_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Bump Task.updated when its brigades change, polling clients compare it (see api.views.get_tasks)
+    """
+
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if not reverse:
+        Task.objects.filter(pk=instance.pk).update(updated=timezone.now())
+    elif pk_set:
+        Task.objects.filter(pk__in=pk_set).update(updated=timezone.now())
+
+
+@receiver(m2m_changed, sender=Brigade.workers.through)
+def touch_brigade_on_workers_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Bump Brigade.updated when its workers change
+    """
+
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if not reverse:
+        Brigade.objects.filter(pk=instance.pk).update(updated=timezone.now())
+    elif pk_set:
+        Brigade.objects.filter(pk__in=pk_set).update(updated=timezone.now())
+
+
+# User fields nested in task payloads or copied to TaskMembership, saving
+# only others (like `last_login` on every admin login) changes neither
+MEMBER_FIELDS = {"telegram_id", "first_name", "last_name", "middle_name", "phone_number", "specialization", "specialization_id", "role"}
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Worker)
+@receiver(post_save, sender=Foreman)
+def update_brigades_on_member_change(sender, instance, created, update_fields, **kwargs):
+    """
+    Task payloads nest the profile of every brigade member and TaskMembership
+    holds their telegram ID. Bump Brigade.updated of the user's brigades,
+    re-sync their tasks' memberships and drop the cached lists showing them.
+    """
+
+    if created or (update_fields is not None and not MEMBER_FIELDS & set(update_fields)):
+        return
+
+    brigade_ids = set(Brigade.objects.filter(Q(foreman=instance.pk) | Q(workers=instance.pk)).values_list("pk", flat=True))
+    if not brigade_ids:
+        return
+
+    Brigade.objects.filter(pk__in=brigade_ids).update(updated=timezone.now())
+    sync_task_memberships(brigade_task_ids(brigade_ids))
+    invalidate_users(brigade_audience(brigade_ids))
+
+
+@receiver(pre_delete, sender=User)
+@receiver(pre_delete, sender=Worker)
+@receiver(pre_delete, sender=Foreman)
+def update_brigades_on_member_delete(sender, instance, **kwargs):
+    """
+    The user leaves their brigades by cascade, no m2m_changed is sent for it.
+    Bump Brigade.updated and drop the cached lists while the audience still
+    includes them, their tasks' memberships are re-synced once they are gone.
+    """
+
+    brigade_ids = set(Brigade.objects.filter(Q(foreman=instance.pk) | Q(workers=instance.pk)).values_list("pk", flat=True))
+    if not brigade_ids:
+        return
+
+    instance._deleted_task_ids = brigade_task_ids(brigade_ids)
+    Brigade.objects.filter(pk__in=brigade_ids).update(updated=timezone.now())
+    invalidate_users(brigade_audience(brigade_ids))
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Worker)
+@receiver(post_delete, sender=Foreman)
+def sync_memberships_on_member_delete(sender, instance, **kwargs):
+    sync_task_memberships(getattr(instance, "_deleted_task_ids", []))
+
+
+@receiver(post_save, sender=Task)
+def sync_memberships_on_task_save(sender, instance, created, **kwargs):
+    """
+    Keep TaskMembership (see api.memberships) in line, the deadline is copied there
+    """
+
+    if not created:
+        sync_task_memberships([instance.pk])
+
+
+@receiver(post_save, sender=Task)
+def publish_task_updated(sender, instance, created, **kwargs):
+    """
+    Stream the edit to everyone the task is assigned to (see api.events)
+    """
+
+    if not created:
+        members = TaskMembership.objects.filter(task=instance).values_list("telegram_id", "task_id")
+        publish(members, "updated")
+
+
+@receiver(pre_delete, sender=Task)
+def record_tombstones_on_task_delete(sender, instance, **kwargs):
+    # Memberships go away with the task by cascade, without a sync
+    record_tombstones(TaskMembership.objects.filter(task=instance))
+
+
+@receiver(m2m_changed, sender=Task.brigades.through)
+def sync_memberships_on_brigades_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and reverse:
+        instance._cleared_task_ids = brigade_task_ids([instance.pk])
+    elif action in ("post_add", "post_remove"):
+        sync_task_memberships([instance.pk] if not reverse else pk_set)
+    elif action == "post_clear":
+        sync_task_memberships([instance.pk] if not reverse else instance._cleared_task_ids)
+
+
+@receiver(m2m_changed, sender=Brigade.workers.through)
+def sync_memberships_on_workers_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and reverse:
+        instance._cleared_task_ids = brigade_task_ids(instance.worker_brigade.values("pk"))
+    elif action in ("post_add", "post_remove"):
+        sync_task_memberships(brigade_task_ids([instance.pk] if not reverse else pk_set))
+    elif action == "post_clear":
+        sync_task_memberships(brigade_task_ids([instance.pk]) if not reverse else instance._cleared_task_ids)
+
+
+@receiver(post_save, sender=Brigade)
+def sync_memberships_on_brigade_save(sender, instance, created, **kwargs):
+    # The foreman may have changed
+    if not created:
+        sync_task_memberships(brigade_task_ids([instance.pk]))
+
+
+@receiver(pre_delete, sender=Brigade)
+def remember_brigade_tasks(sender, instance, **kwargs):
+    instance._deleted_task_ids = brigade_task_ids([instance.pk])
+
+
+@receiver(post_delete, sender=Brigade)
+def sync_memberships_on_brigade_delete(sender, instance, **kwargs):
+    sync_task_memberships(instance._deleted_task_ids)
+
+
+@receiver(post_save, sender=Task)
+@receiver(pre_delete, sender=Task)
+def invalidate_task_cache_on_task_change(sender, instance, **kwargs):
+    """
+    Drop cached task lists (see api.cache) of everyone the task is assigned to
+    """
+
+    invalidate_users(task_members([instance.pk]))
+
+
+@receiver(m2m_changed, sender=Task.brigades.through)
+def invalidate_task_cache_on_brigades_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ("post_add", "post_remove"):
+        if not reverse:
+            # Current assignees plus the members of removed brigades
+            invalidate_users(task_members([instance.pk]) | brigade_members(pk_set))
+        else:
+            invalidate_users(task_members(pk_set) | brigade_members([instance.pk]))
+    elif action == "pre_clear":
+        invalidate_users(task_members([instance.pk]) if not reverse else brigade_audience([instance.pk]))
+
+
+@receiver(m2m_changed, sender=Brigade.workers.through)
+def invalidate_task_cache_on_workers_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ("post_add", "post_remove"):
+        if not reverse:
+            changed = Worker.objects.filter(pk__in=pk_set).values_list("telegram_id", flat=True)
+            invalidate_users(brigade_audience([instance.pk]) | set(changed))
+        else:
+            invalidate_users(brigade_audience(pk_set) | {instance.telegram_id})
+    elif action == "pre_clear":
+        if not reverse:
+            invalidate_users(brigade_audience([instance.pk]))
+        else:
+            invalidate_users(brigade_audience(instance.worker_brigade.values("pk")) | {instance.telegram_id})
+
+
+@receiver(pre_save, sender=Brigade)
+def remember_brigade_foreman(sender, instance, **kwargs):
+    instance._previous_foreman_telegram_id = (
+        Brigade.objects
+        .filter(pk=instance.pk)
+        .values_list("foreman__telegram_id", flat=True)
+        .first()
+    )
+
+
+@receiver(post_save, sender=Brigade)
+@receiver(pre_delete, sender=Brigade)
+def invalidate_task_cache_on_brigade_change(sender, instance, **kwargs):
+    invalidate_users(brigade_audience([instance.pk]) | {getattr(instance, "_previous_foreman_telegram_id", None)})
+
+
+@receiver(post_save, sender=Specialization)
+@receiver(post_delete, sender=Specialization)
+def invalidate_task_cache_on_specialization_change(sender, instance, **kwargs):
+    # Specializations are nested in every worker of every payload
+    invalidate_all()
 
 
 @receiver(pre_delete, sender=Task)
@@ -1,12 +1,153 @@
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from requests.adapters import HTTPAdapter
 from django.conf import settings
 
+from api.ratelimit import RateLimiter
+
+
+class TelegramError(Exception):
+    """
+    Raised when the Bot API refuses a request or can not be reached after all retries
+    """
+
+    def __init__(self, message, status_code=None, retry_after=None, retries=0):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.retries = retries
+
+
+# Outcome of a single message, `latency` is in seconds and includes retries and pacing
+SendResult = namedtuple("SendResult", ["chat_id", "ok", "status_code", "retries", "latency", "error", "data"])
+
+
+class TelegramClient:
+    """
+    Bot API client reusing one HTTP session, so consecutive calls share
+    pooled keep-alive connections instead of a new TCP+TLS handshake each.
+
+    Rate limited (429) calls are retried after Telegram's `retry_after`,
+    network errors and 5xx responses with an exponential backoff. Every
+    attempt is paced by `limiter` when one is given.
+    """
+
+    def __init__(self, token=None, api_url=None, timeout=None, max_retries=None, backoff=None, pool_size=None, limiter=None):
+        self.token = token or settings.TELEGRAM_BOT_TOKEN
+        self.api_url = (api_url or settings.TELEGRAM_API_URL).rstrip("/")
+        self.timeout = timeout or (settings.TELEGRAM_CONNECT_TIMEOUT, settings.TELEGRAM_READ_TIMEOUT)
+        self.max_retries = settings.TELEGRAM_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = settings.TELEGRAM_RETRY_BACKOFF if backoff is None else backoff
+        self.pool_size = pool_size or settings.TELEGRAM_POOL_SIZE
+        self.limiter = limiter
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @property
+    def base_url(self):
+        return f"{self.api_url}/bot{self.token}"
+
+    def request(self, method, **params):
+        """
+        Call a Bot API method, returns `(data, status_code, retries)` and raises `TelegramError` on failure
+        """
+
+        attempt = 0
+
+        while True:
+            if self.limiter is not None:
+                self.limiter.wait(params.get("chat_id"))
+
+            try:
+                response = self.session.post(f"{self.base_url}/{method}", json=params, timeout=self.timeout)
+            except requests.RequestException as e:
+                if attempt >= self.max_retries:
+                    raise TelegramError(f"{e}", retries=attempt) from e
+                delay = self.backoff * 2 ** attempt
+            else:
+                try:
+                    data = response.json()
+                except ValueError:
+                    data = {}
+
+                if response.ok and data.get("ok"):
+                    return data, response.status_code, attempt
+
+                status_code = response.status_code
+                retry_after = (data.get("parameters") or {}).get("retry_after")
+                retryable = status_code == 429 or status_code >= 500
+
+                if not retryable or attempt >= self.max_retries:
+                    raise TelegramError(
+                        data.get("description") or f"HTTP {status_code}",
+                        status_code=status_code,
+                        retry_after=retry_after,
+                        retries=attempt,
+                    )
+                delay = retry_after if retry_after else self.backoff * 2 ** attempt
+
+            attempt += 1
+            time.sleep(delay)
+
+    def call(self, method, **params):
+        """
+        Call a Bot API method and return the decoded response, raises `TelegramError` on failure
+        """
+
+        return self.request(method, **params)[0]
+
+    def send_message(self, chat_id, text, parse_mode="HTML", **params):
+        return self.call("sendMessage", chat_id=chat_id, text=text, parse_mode=parse_mode, **params)
+
+    def send(self, chat_id, text, parse_mode="HTML", **params):
+        """
+        Like `send_message`, but never raises and reports how the delivery went as a `SendResult`
+        """
+
+        started = time.monotonic()
+
+        try:
+            data, status_code, retries = self.request(
+                "sendMessage", chat_id=chat_id, text=text, parse_mode=parse_mode, **params
+            )
+        except TelegramError as e:
+            return SendResult(chat_id, False, e.status_code, e.retries, time.monotonic() - started, f"{e}", None)
+
+        return SendResult(chat_id, True, status_code, retries, time.monotonic() - started, "", data)
+
+    def send_many(self, messages, concurrency=None):
+        """
+        Send `(chat_id, text)` pairs over the shared pool, returns a `SendResult` per message in the same order
+        """
+
+        def send(message):
+            chat_id, text = message
+            return self.send(chat_id, text)
+
+        with ThreadPoolExecutor(max_workers=concurrency or self.pool_size) as executor:
+            return list(executor.map(send, messages))
+
+
+_client = None
+
+
+def get_client():
+    """
+    Process wide client, created on first use
+    """
+
+    global _client
+
+    if _client is None:
+        _client = TelegramClient(limiter=RateLimiter() if settings.TELEGRAM_RATE_LIMIT else None)
+    return _client
+
+
 def send_message(chat_id, text):
-    url = f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage"
-    payload = {
-        "chat_id": chat_id,
-        "text": text,
-        "parse_mode": "HTML",
-    }
-    response = requests.get(url, params=payload)
-    return response.json()
+    return get_client().send_message(chat_id=chat_id, text=text)
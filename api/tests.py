@@ -0,0 +1,366 @@
+import asyncio
+from datetime import date, time, timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connections
+from django.utils import timezone
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from api.broadcasts import claim_broadcast
+from api.notifications import dispatch_pending
+from api.telegram import SendResult
+from api.events import stream
+from api.reports import build_attendance_report, claim_report_job
+from api.models import BotUser, Day, Attendance, Specialization, Foreman, Worker, Brigade, Task, TaskEvent, Broadcast, ReportJob, Notification, TaskMembership, TaskTombstone
+
+
+def create_bot_tables():
+    """
+    The bot database is managed by the bot, its tables are not migrated here
+    """
+
+    connection = connections["bot"]
+    existing = connection.introspection.table_names()
+
+    with connection.schema_editor() as schema_editor:
+        for model in (BotUser, Day, Attendance):
+            if model._meta.db_table not in existing:
+                schema_editor.create_model(model)
+
+
+class BotDatabaseTestCase(TestCase):
+    databases = {"default", "bot"}
+
+    @classmethod
+    def setUpClass(cls):
+        # Before the class wide transaction is opened, SQLite can not alter its schema inside one
+        create_bot_tables()
+        super().setUpClass()
+
+
+@override_settings(CACHES={
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tasks"},
+    "counters": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "counters"},
+})
+class TaskTestCase(BotDatabaseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.specialization = Specialization.objects.create(name="Сварщик")
+        cls.counter = 0
+
+    @classmethod
+    def create_user(cls, model):
+        cls.counter += 1
+        telegram_id = str(1000 + cls.counter)
+        BotUser.objects.using("bot").create(telegram_id=telegram_id, first_name=f"Имя {cls.counter}")
+
+        return model.objects.create(
+            telegram_id=telegram_id,
+            phone_number=telegram_id,
+            first_name=f"Имя {cls.counter}",
+            last_name="Фамилия",
+            type_of_document="passport",
+            specialization=cls.specialization,
+        )
+
+    def create_brigade(self, workers):
+        brigade = Brigade.objects.create(name=f"Бригада {self.counter}", foreman=self.create_user(Foreman))
+        brigade.workers.set(workers)
+        return brigade
+
+    def create_task(self, brigades):
+        task = Task.objects.create(name="Задача", description="Описание", is_done=False, deadline=date.today() + timedelta(days=7))
+        task.brigades.set(brigades)
+        return task
+
+
+class GetTasksQueriesTest(TaskTestCase):
+    """
+    `get_tasks` loads everything TaskSerializer nests up front, the number
+    of queries does not depend on how many tasks, brigades or workers there are
+    """
+
+    def get_tasks(self, telegram_id, expected):
+        cache.clear()
+
+        with self.assertNumQueries(6):
+            response = self.client.get("/api/v1/tasks/", {"telegram_id": telegram_id})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), expected)
+
+    def test_single_task(self):
+        worker = self.create_user(Worker)
+        self.create_task([self.create_brigade([worker])])
+
+        self.get_tasks(worker.telegram_id, 1)
+
+    def test_many_tasks(self):
+        worker = self.create_user(Worker)
+        brigades = [
+            self.create_brigade([worker] + [self.create_user(Worker) for _ in range(5)])
+            for _ in range(3)
+        ]
+        for index in range(10):
+            self.create_task(brigades[:index % 3 + 1])
+
+        self.get_tasks(worker.telegram_id, 10)
+
+
+class GetTasksConditionalTest(TaskTestCase):
+    """
+    Task lists are revalidated by ETag only, removals and renames raise no `updated` a Last-Modified could follow
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.worker = self.create_user(Worker)
+        self.brigade = self.create_brigade([self.worker])
+        self.tasks = [self.create_task([self.brigade]) for _ in range(2)]
+
+    def get_tasks(self, **headers):
+        return self.client.get("/api/v1/tasks/", {"telegram_id": self.worker.telegram_id}, headers=headers)
+
+    def test_no_last_modified(self):
+        self.assertNotIn("Last-Modified", self.get_tasks())
+
+    def test_removed_task(self):
+        self.get_tasks()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tasks[0].delete()
+
+        response = self.get_tasks(if_modified_since="Fri, 01 Jan 2100 00:00:00 GMT")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 1)
+
+    def test_renamed_specialization(self):
+        etag = self.get_tasks()["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.specialization.name = "Монтажник"
+            self.specialization.save()
+
+        response = self.get_tasks(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Монтажник", response.content.decode())
+
+
+class GetTasksCacheTest(TaskTestCase):
+    def setUp(self):
+        cache.clear()
+        self.worker = self.create_user(Worker)
+        self.task = self.create_task([self.create_brigade([self.worker])])
+
+    def get_tasks(self, **params):
+        return self.client.get("/api/v1/tasks/", {"telegram_id": self.worker.telegram_id, **params})
+
+    def test_outdated_list_is_not_served(self):
+        """
+        A list stored after its key was invalidated, here an edit whose
+        on_commit invalidation never runs, is rebuilt instead of served
+        """
+
+        for params in ({}, {"compact": "1"}):
+            with self.subTest(**params):
+                etag = self.get_tasks(**params)["ETag"]
+                self.task.name = f"Задача {params}"
+                self.task.save()
+
+                response = self.get_tasks(**params)
+                self.assertNotEqual(response["ETag"], etag)
+                self.assertEqual(response.json()[0]["name"], self.task.name)
+
+
+class MemberSaveTest(TaskTestCase):
+    """
+    Saving a brigade member touches their brigades only when something task payloads show changed
+    """
+
+    def setUp(self):
+        self.worker = self.create_user(Worker)
+        self.brigade = self.create_brigade([self.worker])
+        Brigade.objects.filter(pk=self.brigade.pk).update(updated=timezone.now() - timedelta(days=1))
+        self.brigade.refresh_from_db()
+
+    def brigade_updated(self):
+        return Brigade.objects.get(pk=self.brigade.pk).updated
+
+    def test_login(self):
+        self.worker.last_login = timezone.now()
+        self.worker.save(update_fields=["last_login"])
+
+        self.assertEqual(self.brigade_updated(), self.brigade.updated)
+
+    def test_profile_change(self):
+        for update_fields in (["first_name"], None):
+            with self.subTest(update_fields=update_fields):
+                self.worker.first_name = f"Имя {update_fields}"
+                self.worker.save(update_fields=update_fields)
+
+                self.assertGreater(self.brigade_updated(), self.brigade.updated)
+
+
+class MemberDeleteTest(TaskTestCase):
+    """
+    Deleting a brigade member drops them from the cached lists of everyone
+    left in the brigade and from the memberships of the brigade's tasks
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.worker, self.deleted = self.create_user(Worker), self.create_user(Worker)
+        self.brigade = self.create_brigade([self.worker, self.deleted])
+        self.task = self.create_task([self.brigade])
+
+    def get_tasks(self, **headers):
+        return self.client.get("/api/v1/tasks/", {"telegram_id": self.worker.telegram_id}, headers=headers)
+
+    def test_deleted_worker(self):
+        etag = self.get_tasks()["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.deleted.delete()
+
+        response = self.get_tasks(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertNotIn(self.deleted.telegram_id, response.content.decode())
+
+    def test_memberships(self):
+        self.deleted.delete()
+
+        self.assertFalse(TaskMembership.objects.filter(telegram_id=self.deleted.telegram_id).exists())
+        self.assertTrue(TaskMembership.objects.filter(telegram_id=self.worker.telegram_id).exists())
+        self.assertTrue(TaskTombstone.objects.filter(telegram_id=self.deleted.telegram_id, task_id=self.task.pk).exists())
+        self.assertTrue(TaskEvent.objects.filter(telegram_id=self.deleted.telegram_id, task_id=self.task.pk, kind="removed").exists())
+
+
+@override_settings(TASK_EVENTS_POLL_INTERVAL=0, TASK_EVENTS_HEARTBEAT=60)
+class TaskEventStreamTest(TestCase):
+    """
+    A lower event ID committed after a higher one was sent, as concurrent
+    transactions do, still reaches the stream
+    """
+
+    async def publish(self, pk):
+        await TaskEvent.objects.acreate(pk=pk, telegram_id="1", task_id=pk, kind="removed")
+
+    async def next_event(self, events):
+        # The stream polls until something comes, a skipped event would hang the test
+        return await asyncio.wait_for(anext(events), timeout=5)
+
+    async def test_late_commit(self):
+        events = stream("1")
+        await anext(events)
+
+        await self.publish(10)
+        self.assertIn("id: 10\n", await self.next_event(events))
+
+        await self.publish(5)
+        self.assertIn("id: 5\n", await self.next_event(events))
+
+    async def test_late_commit_after_resume(self):
+        await self.publish(10)
+        events = stream("1", last_event_id=10)
+        await anext(events)
+
+        await self.publish(8)
+        self.assertIn("id: 8\n", await self.next_event(events))
+
+
+class TaskEventsViewTest(TestCase):
+    def test_wsgi(self):
+        # WSGI would buffer the endless stream instead of sending it
+        response = self.client.get("/api/v1/tasks/events/", {"telegram_id": "1"})
+        self.assertEqual(response.status_code, 501)
+
+    async def test_asgi(self):
+        response = await self.async_client.get("/api/v1/tasks/events/", {"telegram_id": "1"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+
+
+class AttendanceReportQueriesTest(BotDatabaseTestCase):
+    """
+    The report reads the bot database in a fixed number of queries, however many workers and days it covers
+    """
+
+    def create_attendance(self, workers, days):
+        first = date.today() - timedelta(days=days - 1)
+        users = [
+            BotUser.objects.using("bot").create(telegram_id=f"{workers}-{index}", first_name=f"Имя {index}")
+            for index in range(workers)
+        ]
+        days = [Day.objects.using("bot").create(date=first + timedelta(days=index)) for index in range(days)]
+
+        Attendance.objects.using("bot").bulk_create([
+            Attendance(worker=user, day=day, is_absent=False, start_time=time(8), end_time=time(17))
+            for user in users
+            for day in days
+        ])
+        return [day.date for day in days]
+
+    def count_queries(self, month_days):
+        with CaptureQueriesContext(connections["bot"]) as queries:
+            build_attendance_report(month_days, "Отчет").close()
+        return len(queries)
+
+    def test_fixed_query_count(self):
+        small = self.count_queries(self.create_attendance(2, 3))
+        large = self.count_queries(self.create_attendance(20, 40))
+
+        self.assertEqual(small, 3)
+        self.assertEqual(large, small)
+
+
+class StaleJobsTest(TestCase):
+    """
+    Rows left running by a worker that died are released on the next claim
+    """
+
+    def create(self, model, minutes_ago, **fields):
+        row = model.objects.create(status="running", **fields)
+        model.objects.filter(pk=row.pk).update(updated=timezone.now() - timedelta(minutes=minutes_ago))
+        return row
+
+    def test_broadcast_is_queued_again(self):
+        stale = self.create(Broadcast, 60, text="Объявление")
+        self.create(Broadcast, 0, text="Объявление")
+
+        self.assertEqual(claim_broadcast(), stale)
+        self.assertIsNone(claim_broadcast())
+
+    def test_report_job_fails(self):
+        stale = self.create(ReportJob, 60)
+        running = self.create(ReportJob, 0)
+
+        self.assertIsNone(claim_report_job())
+        stale.refresh_from_db()
+        running.refresh_from_db()
+        self.assertEqual(stale.status, "failed")
+        self.assertEqual(running.status, "running")
+
+
+@override_settings(NOTIFICATION_SENDING_TIMEOUT=0)
+class DispatchClaimTest(TestCase):
+    """
+    A dispatcher renews its claim while it sends and skips rows another dispatcher took over
+    """
+
+    def test_taken_over_row_is_skipped(self):
+        first, second, third = [Notification.objects.create(chat_id=str(index), text="Текст") for index in range(3)]
+        sent = []
+
+        def send(chat_id, text):
+            if not sent:
+                # Another dispatcher released the second row as stale and claimed it
+                Notification.objects.filter(pk=second.pk).update(updated=timezone.now())
+            sent.append(chat_id)
+            return SendResult(chat_id, True, 200, 0, 0.01, "", {})
+
+        with mock.patch("api.notifications.get_client") as get_client:
+            get_client.return_value.send.side_effect = send
+            dispatch_pending()
+
+        self.assertEqual(sent, [first.chat_id, third.chat_id])
+        self.assertEqual(Notification.objects.get(pk=second.pk).status, "sending")
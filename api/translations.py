@@ -1,6 +1,15 @@
+from collections import OrderedDict
+from threading import Lock
+
 from django.utils.translation import override, gettext_lazy as _
 
 
+TASK_MESSAGE_CACHE_SIZE = 256
+
+_task_messages = OrderedDict()
+_task_messages_lock = Lock()
+
+
 def build_task_message(lang, title, description, deadline):
     """
     Function to manually build tranlsation to send message via Telegram API to user's telegram
@@ -16,3 +25,47 @@ def build_task_message(lang, title, description, deadline):
                 text += f"\n\n<i>{_('Что бы прочитать полностью, перейдите в раздел задач с командой /tasks')}</i>"
 
     return text
+
+
+def build_task_message_for(task, lang):
+    """
+    Message about a Task in the given language.
+
+    Rendered once per task revision and language, a fan-out to hundreds of
+    recipients reuses the same couple of strings.
+    """
+
+    key = (task.pk, task.updated, lang)
+
+    with _task_messages_lock:
+        text = _task_messages.get(key)
+        if text is not None:
+            _task_messages.move_to_end(key)
+            return text
+
+    description = task.description[:100] + "..." if len(task.description) > 100 else task.description
+    text = build_task_message(
+        lang=lang,
+        title=task.name,
+        description=description,
+        deadline=task.deadline.strftime("%d-%m-%Y"),
+    )
+
+    with _task_messages_lock:
+        _task_messages[key] = text
+        if len(_task_messages) > TASK_MESSAGE_CACHE_SIZE:
+            _task_messages.popitem(last=False)
+
+    return text
+
+
+def build_digest_message(lang, texts):
+    """
+    Combine several task messages for one recipient into a single digest
+    """
+
+    with override(lang):
+        text = f"<b>{_('Новые задачи')}: {len(texts)}</b>\n\n"
+        text += "\n\n— — —\n\n".join(texts)
+
+    return text
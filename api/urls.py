@@ -1,12 +1,24 @@
+from django.conf import settings
 from django.urls import path
 
 from . import views
 
+if settings.ASYNC_API_VIEWS:
+    from . import async_views as bot_views
+else:
+    bot_views = views
+
 urlpatterns = [
     path('register-user/', views.register_user),
-    path('tasks/', views.get_tasks),
-    path('save-finished-word-details/', views.save_finished_task_details),
-    path('specializations/', views.get_specializations),
+    path('tasks/', bot_views.get_tasks),
+    path('tasks/changes/', views.get_task_changes),
+    path('tasks/events/', views.task_events),
+    path('save-finished-word-details/', bot_views.save_finished_task_details),
+    path('specializations/', bot_views.get_specializations),
     path('download-report-component/', views.download_report_component, name="download_report_component"),
     path('download-attendance-report/', views.download_attendance_report, name="download_attendance_report"),
+    path('report-jobs/', views.create_report_job, name="create_report_job"),
+    path('report-jobs/<int:pk>/', views.report_job_status, name="report_job_status"),
+    path('report-jobs/<int:pk>/download/', views.download_report_job, name="download_report_job"),
+    path('metrics/', views.metrics, name="metrics"),
 ]
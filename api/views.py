@@ -1,26 +1,36 @@
 from json import dumps
+from hashlib import md5
 from urllib.parse import quote
 from datetime import datetime, timedelta, date
-import calendar
 
 from django.views.decorators.clickjacking import xframe_options_exempt
-from django.shortcuts import render
+from django.views.decorators.http import condition, require_POST
+from django.contrib.admin.views.decorators import staff_member_required
+from django.shortcuts import render, get_object_or_404
+from django.urls import reverse
+from django.conf import settings
 from django.utils import timezone
-from django.db.models import Q, F, Prefetch
+from django.core import signing
+from django.db.models import F, Prefetch, Max, Count
 from django.http import JsonResponse
 from django.contrib.auth import get_user_model
-from django.http import HttpResponse, HttpResponseBadRequest
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse, FileResponse
+from django.core.handlers.asgi import ASGIRequest
 
 from rest_framework.views import csrf_exempt
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
-import openpyxl
-from openpyxl.styles import Alignment, PatternFill
-
 from django.db import transaction
-from api.models import User, Specialization, Task, FinishedWork, BotUser, Attendance, Day, Worker, FinishedWorkPhoto
-from api.serializers import TaskSerializer
+from api.models import User, Specialization, Task, FinishedWork, Worker, FinishedWorkPhoto, Brigade, ReportJob
+from api.serializers import TaskSerializer, CompactTaskSerializer
+from api.pagination import TaskCursorPagination
+from api.memberships import task_changes, tombstone_horizon
+from api.events import stream as event_stream
+from api.reports import report_period, build_attendance_report
+from api.cache import get_user_tasks, cache_stats
+from api.metrics import delivery_stats
+from api.ratelimit import get_bucket_state
 
 
 User = get_user_model()
@@ -115,20 +125,250 @@ def register_user(request):
     return JsonResponse({"status": "ok"})
 
 
+def user_tasks(telegram_id):
+    """
+    Open tasks of the brigades a user is foreman or worker of.
+
+    Read from the TaskMembership index, a single range scan on
+    (telegram_id, deadline) instead of joining brigades and workers.
+    """
+
+    return Task.objects.filter(
+        memberships__telegram_id=telegram_id,
+        memberships__deadline__gte=date.today(),
+    )
+
+
+def tasks_version(request):
+    """
+    Version of a user's task list, computed without serializing it.
+
+    Built from the tasks' ids and `updated`, the latest change of their
+    brigades (membership and member profiles bump it, see api.signals) and
+    of specializations. Memoized on the request.
+    """
+
+    if not hasattr(request, "_tasks_version"):
+        stamps = list(
+            user_tasks(request.GET.get("telegram_id"))
+            .order_by("pk")
+            .values_list("pk", "updated")
+        )
+        brigades_updated = Brigade.objects.filter(task__in=[pk for pk, _ in stamps]).aggregate(updated=Max("updated"))["updated"]
+        specializations_updated = Specialization.objects.aggregate(updated=Max("updated"))["updated"]
+
+        request._tasks_version = tasks_fingerprint(stamps, brigades_updated, specializations_updated)
+
+    return request._tasks_version
+
+
+def tasks_fingerprint(stamps, brigades_updated, specializations_updated):
+    return md5(repr((stamps, brigades_updated, specializations_updated)).encode()).hexdigest()
+
+
+def tasks_etag(request, version=None):
+    """
+    ETag of a task list response, there is no Last-Modified since a task
+    leaving the list or a renamed specialization raises no `updated` of it
+    """
+
+    version = tasks_version(request) if version is None else version
+    # The query string is part of it, filters and formats change the payload too
+    return md5(f"{version}:{request.GET.urlencode()}".encode()).hexdigest()
+
+
+def requested_fields(request):
+    """
+    `(compact, fields, unknown)` asked for with `?compact=1` / `?fields=`
+    """
+
+    fields = request.GET.get("fields")
+    compact = bool(fields) or request.GET.get("compact") in ("1", "true")
+
+    if not compact:
+        return False, [], set()
+
+    allowed = CompactTaskSerializer.Meta.fields
+    fields = [field.strip() for field in fields.split(",") if field.strip()] if fields else allowed
+    return True, fields, set(fields) - set(allowed)
+
+
+def unknown_fields_response(unknown):
+    allowed = CompactTaskSerializer.Meta.fields
+    return HttpResponseBadRequest(f"Unknown fields: {', '.join(sorted(unknown))}. Expected any of {', '.join(allowed)}.")
+
+
+def with_compact_relations(tasks):
+    return tasks.prefetch_related(Prefetch("brigades", queryset=Brigade.objects.only("id", "name")))
+
+
+def with_full_relations(tasks):
+    # Load everything TaskSerializer nests in 3 queries, instead of several per task
+    return tasks.prefetch_related(
+        Prefetch(
+            "brigades",
+            queryset=Brigade.objects.select_related("foreman__specialization").prefetch_related(
+                Prefetch("workers", queryset=Worker.objects.select_related("specialization"))
+            ),
+        )
+    )
+
+
+@condition(etag_func=tasks_etag)
 @api_view(["GET"])
 def get_tasks(request):
-    telegram_id = request.GET.get("telegram_id")
+    """
+    Tasks of a user. `?compact=1` returns the slim payload of CompactTaskSerializer,
+    `?fields=id,name` narrows it further to the listed fields.
+
+    Passing `cursor`, `page_size`, `deadline_before` or `is_done` switches to a
+    page of TaskCursorPagination ordered by deadline, those are not cached.
+    """
 
-    tasks = Task.objects.filter(
-        Q(brigades__foreman__telegram_id=telegram_id) |  # foreman of brigade
-        Q(brigades__workers__telegram_id=telegram_id)    # any worker in brigade
-    ).filter(deadline__gte=date.today()).distinct()
+    telegram_id = request.GET.get("telegram_id")
+    compact, fields, unknown = requested_fields(request)
+
+    if unknown:
+        return unknown_fields_response(unknown)
+
+    def compact_tasks():
+        return with_compact_relations(user_tasks(telegram_id))
+
+    def full_tasks():
+        return with_full_relations(user_tasks(telegram_id))
+
+    if any(param in request.GET for param in ("cursor", "page_size", "deadline_before", "is_done")):
+        tasks = compact_tasks() if compact else full_tasks()
+
+        deadline_before = request.GET.get("deadline_before")
+        if deadline_before:
+            try:
+                tasks = tasks.filter(deadline__lt=date.fromisoformat(deadline_before))
+            except ValueError:
+                return HttpResponseBadRequest("Invalid deadline_before. Expected YYYY-MM-DD.")
+
+        is_done = request.GET.get("is_done")
+        if is_done:
+            if is_done not in ("1", "true", "0", "false"):
+                return HttpResponseBadRequest("Invalid is_done. Expected 1, true, 0 or false.")
+            tasks = tasks.filter(is_done=is_done in ("1", "true"))
+
+        paginator = TaskCursorPagination()
+        page = paginator.paginate_queryset(tasks, request)
+        serializer = CompactTaskSerializer(page, many=True, fields=fields) if compact else TaskSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    if compact:
+        # Every projection is served from the one cached compact list
+        tasks = get_user_tasks(
+            telegram_id, lambda: CompactTaskSerializer(compact_tasks(), many=True).data, tasks_version(request), variant="compact"
+        )
+        return Response(data=[{field: task[field] for field in fields} for task in tasks])
 
-    tasks = TaskSerializer(tasks, many=True).data
+    tasks = get_user_tasks(telegram_id, lambda: TaskSerializer(full_tasks(), many=True).data, tasks_version(request))
 
     return Response(data=tasks)
 
 
+def sync_token(moment):
+    return signing.dumps(moment.isoformat(), salt="api.tasks.changes")
+
+
+def parse_sync_point(value):
+    """
+    Moment a `since` parameter stands for, either a sync token or an ISO timestamp
+    """
+
+    try:
+        moment = datetime.fromisoformat(signing.loads(value, salt="api.tasks.changes"))
+    except signing.BadSignature:
+        try:
+            moment = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+@api_view(["GET"])
+def get_task_changes(request):
+    """
+    What changed in a user's task list since `?since=`, a `sync_token` of an
+    earlier response or an ISO timestamp.
+
+    Returns the changed tasks in full and the IDs of removed ones. Without
+    `since`, or when it is older than the tombstones reach back, the whole
+    list is returned with `reset` set and the client should replace its copy.
+    Accepts `compact` and `fields` like `get_tasks`.
+    """
+
+    telegram_id = request.GET.get("telegram_id")
+    compact, fields, unknown = requested_fields(request)
+
+    if unknown:
+        return unknown_fields_response(unknown)
+
+    now = timezone.now()
+    since = request.GET.get("since")
+
+    if since:
+        since = parse_sync_point(since)
+        if since is None:
+            return HttpResponseBadRequest("Invalid since. Expected a sync_token or an ISO timestamp.")
+
+    tasks = user_tasks(telegram_id)
+    removed = set()
+    reset = not since or since < tombstone_horizon()
+
+    if not reset:
+        changed, removed = task_changes(telegram_id, since)
+        tasks = tasks.filter(pk__in=changed)
+
+    if compact:
+        data = CompactTaskSerializer(with_compact_relations(tasks), many=True, fields=fields).data
+    else:
+        data = TaskSerializer(with_full_relations(tasks), many=True).data
+
+    return Response(data={
+        "tasks": data,
+        "removed": sorted(removed),
+        "reset": reset,
+        "sync_token": sync_token(now),
+    })
+
+
+async def task_events(request):
+    """
+    Server-Sent Events of a user's task list (see api.events), `text/event-stream`.
+
+    Served under ASGI only (see PROJECT/asgi.py), WSGI buffers the whole
+    stream before sending anything and answers 501. Connections are closed
+    after TASK_EVENTS_MAX_DURATION seconds, EventSource reconnects on its own.
+    """
+
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse("Task events need an ASGI server.", status=501)
+
+    telegram_id = request.GET.get("telegram_id")
+    if not telegram_id:
+        return HttpResponseBadRequest("Missing telegram_id.")
+
+    last_event_id = request.headers.get("Last-Event-ID") or request.GET.get("last_event_id")
+    if last_event_id is not None:
+        try:
+            last_event_id = int(last_event_id)
+        except ValueError:
+            return HttpResponseBadRequest("Invalid Last-Event-ID. Expected an integer.")
+
+    response = StreamingHttpResponse(event_stream(telegram_id, last_event_id), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Stops nginx from buffering the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
 @api_view(["POST"])
 def save_finished_task_details(request):
     # try:
@@ -152,6 +392,25 @@ def save_finished_task_details(request):
         # return Response(data={"success": False, "details": f"{e}"}, status=500)
 
 
+def specializations_version(request):
+    """
+    ETag of the specialization list, from a single aggregate query.
+    No Last-Modified, deleting a specialization does not raise the latest `updated`.
+    """
+
+    if not hasattr(request, "_specializations_version"):
+        stats = Specialization.objects.aggregate(count=Count("id"), updated=Max("updated"))
+        request._specializations_version = specializations_fingerprint(stats)
+
+    return request._specializations_version
+
+
+def specializations_fingerprint(stats):
+    fingerprint = f"{stats['count']}:{stats['updated'] and stats['updated'].isoformat()}"
+    return md5(fingerprint.encode()).hexdigest()
+
+
+@condition(etag_func=specializations_version)
 @api_view(["GET"])
 def get_specializations(request):
     specializations = (
@@ -179,9 +438,13 @@ def finished_works(request):
 
     return  result
 
-def download_attendance_report(request):
-    date_from_raw = request.GET.get("date_from")
-    date_to_raw = request.GET.get("date_to")
+def report_params(params):
+    """
+    `(date_from, date_to, period)` of a report request, raises ValueError with the message for a 400
+    """
+
+    date_from_raw = params.get("date_from")
+    date_to_raw = params.get("date_to")
 
     def parse_html_date(value: str):
         try:
@@ -194,155 +457,90 @@ def download_attendance_report(request):
 
     # If user provided invalid date string -> 400
     if date_from_raw and not date_from:
-        return HttpResponseBadRequest("Invalid date_from. Expected YYYY-MM-DD.")
+        raise ValueError("Invalid date_from. Expected YYYY-MM-DD.")
     if date_to_raw and not date_to:
-        return HttpResponseBadRequest("Invalid date_to. Expected YYYY-MM-DD.")
-
-    today = timezone.now()
-    full_date = timezone.now()
-
-    # ✅ If both dates are provided -> use date range
-    if date_from and date_to:
-        if date_from > date_to:
-            date_from, date_to = date_to, date_from
-
-        start_date = date_from
-        end_date = date_to
-
-        # create list of days inclusive
-        days_count = (end_date - start_date).days + 1
-        month_days = [start_date + timedelta(days=i) for i in range(days_count)]
+        raise ValueError("Invalid date_to. Expected YYYY-MM-DD.")
 
-        # Fetch all Day objects for the range
-        day_objs = Day.objects.filter(date__range=(start_date, end_date))
+    return date_from, date_to, params.get("period", "current_month")
 
-        # Title / filename for range
-        title = f"{start_date:%d.%m.%Y}-{end_date:%d.%m.%Y}"
-        filename = f"Тебель рабочего времени за {start_date:%d.%m.%Y}-{end_date:%d.%m.%Y}.xlsx"
-
-    else:
-        # ✅ fallback: your old dropdown period logic (UNCHANGED)
-        period = request.GET.get("period", "current_month")
-
-        year = full_date.year
-        month = full_date.month
-
-        if period == "prev_month":
-            month -= 1
-            if month < 1:
-                month = 12
-                year -= 1
-
-        # Days in the month
-        _, last_day = calendar.monthrange(year, month)
-        month_days = [date(year, month, day) for day in range(1, last_day + 1)]
-
-        # Fetch all Day objects for the month
-        day_objs = Day.objects.filter(date__year=year, date__month=month)
-
-        title = f"{month if month > 9 else '0' + str(month)}.{year}"
-        filename = f"Тебель рабочего времени за {month:02}.{year}.xlsx"
-
-    # Prefetch Attendance for all users for selected days
-    attendances_qs = Attendance.objects.filter(day__in=day_objs)
-    users = BotUser.objects.prefetch_related(
-        Prefetch('attendance_set', queryset=attendances_qs, to_attr='month_attendance')
-    ).order_by('first_name')
-
-    # Prepare workbook
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = title
-
-    header = ["ФИО сотрудника"] + [f"{d.day if d.day > 9 else '0' + str(d.day)}" for d in month_days] + ["Всего за месяц", "Рабочие дни", "Пропущенные дни"]
-    ws.append(header)
-
-    for col in range(1, len(header) + 1):
-        ws.cell(row=1, column=col).alignment = Alignment(horizontal="center")
-
-    today_date = timezone.now().date()
-    sunday_fill = PatternFill(start_color="FF9999", end_color="FF9999", fill_type="solid")  # red bg for Sunday
-    missed_fill = PatternFill(start_color="FFD966", end_color="FFD966", fill_type="solid")  # orange bg for missed working day
-
-    for user in users:
-        row = [f"{user.first_name or ''} {user.last_name or ''} {user.middle_name or ''}"]
-        total_seconds = 0
-        worked_days = 0
-        missed_days = 0
-        attendance_map = {
-            a.day.date: a
-            for a in getattr(user, 'month_attendance', [])
-        }
-
-        for day_date in month_days:
-            cell_value = "-"
-            att = attendance_map.get(day_date)
-
-            is_sunday = day_date.weekday() == 6
-            is_past_or_today = day_date <= today_date  # includes today
-            is_future = day_date > today_date
-
-            if att and att.start_time:
-                if not att.end_time:
-                    cell_value = f"В процессе"
-                    worked_seconds = 0
-                else:
-                    worked_seconds = (datetime.combine(day_date, att.end_time) - datetime.combine(day_date, att.start_time)).seconds
-                    hours = worked_seconds // 3600
-                    minutes = (worked_seconds % 3600) // 60
-                    cell_value = f"{hours} ч. {minutes} мин."
-
-                total_seconds += worked_seconds
-                worked_days += 1
-            elif not is_sunday and is_past_or_today:
-                missed_days += 1
-
-            row.append(cell_value)
-
-        # Subtract the time workers spent for lunch
-        total_seconds -= 3600
-        if total_seconds < 0:
-            total_seconds = 0
-
-        total_hours = total_seconds // 3600
-        total_minutes = (total_seconds % 3600) // 60
-        row.append(f"{total_hours} ч. {total_minutes} мин.")
-        row.append(worked_days)
-        row.append(missed_days)
-
-        ws.append(row)
-
-        # Center all cells and apply coloring
-        for col_idx, day_date in enumerate(month_days, start=2):
-            cell = ws.cell(row=ws.max_row, column=col_idx)
-            cell.alignment = Alignment(horizontal="center")
-
-            if day_date <= today_date:  # only color past days and today
-                if day_date.weekday() == 6:
-                    cell.fill = sunday_fill
-                elif cell.value == "-":
-                    cell.fill = missed_fill
-
-        # Center total/worked/missed columns
-        for col_idx in range(len(row) - 2, len(row) + 1):
-            ws.cell(row=ws.max_row, column=col_idx).alignment = Alignment(horizontal="center")
-
-    # Auto-width columns
-    for col in ws.columns:
-        max_length = max((len(str(cell.value)) for cell in col if cell.value), default=0)
-        ws.column_dimensions[col[0].column_letter].width = max_length + 2
 
+def report_response(file, filename):
     quoted_filename = quote(filename)  # URL-encode UTF-8
 
-    # Return Excel response
-    response = HttpResponse(
+    # Streamed from the file in chunks
+    response = FileResponse(
+        file,
         content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )
     response['Content-Disposition'] = f"attachment; filename*=UTF-8''{quoted_filename}"
-    wb.save(response)
     return response
 
+
+def download_attendance_report(request):
+    try:
+        date_from, date_to, period = report_params(request.GET)
+    except ValueError as e:
+        return HttpResponseBadRequest(f"{e}")
+
+    month_days, title, filename = report_period(date_from, date_to, period)
+    return report_response(build_attendance_report(month_days, title), filename)
+
+
+@staff_member_required
+@require_POST
+def create_report_job(request):
+    """
+    Queue a report for the `run_report_jobs` worker, takes the fields of download_attendance_report
+    """
+
+    try:
+        date_from, date_to, period = report_params(request.POST)
+    except ValueError as e:
+        return HttpResponseBadRequest(f"{e}")
+
+    job = ReportJob.objects.create(date_from=date_from, date_to=date_to, period=period, requested_by=request.user)
+    return JsonResponse(report_job_state(job), status=201)
+
+
+def report_job_state(job):
+    return {
+        "id": job.pk,
+        "status": job.status,
+        "progress": job.progress,
+        "error": job.error,
+        "status_url": reverse("report_job_status", args=[job.pk]),
+        "download_url": reverse("download_report_job", args=[job.pk]) if job.status == "finished" else None,
+    }
+
+
+@staff_member_required
+def report_job_status(request, pk):
+    return JsonResponse(report_job_state(get_object_or_404(ReportJob, pk=pk)))
+
+
+@staff_member_required
+def download_report_job(request, pk):
+    job = get_object_or_404(ReportJob, pk=pk, status="finished")
+    return report_response(job.file.open("rb"), job.filename)
+
+
 @xframe_options_exempt
 def download_report_component(request):
-    return render(request, "components/download_report.html")
-
+    return render(request, "components/download_report.html", {
+        "job_min_days": settings.REPORT_JOB_MIN_DAYS,
+        "job_timeout": settings.REPORT_JOB_RUNNING_TIMEOUT,
+    })
+
+
+@staff_member_required
+def metrics(request):
+    try:
+        hours = int(request.GET.get("hours", 24))
+    except ValueError:
+        return HttpResponseBadRequest("Invalid hours. Expected an integer.")
+
+    return JsonResponse({
+        "telegram": delivery_stats(since=timezone.now() - timedelta(hours=hours)),
+        "rate_limits": get_bucket_state(keys=["global"]),
+        "task_cache": cache_stats(),
+    })